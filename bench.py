@@ -0,0 +1,465 @@
+# bench.py measures interpreter speed on block programs: a solution to every level plus a few micro benchmarks
+# usage: python bench.py [--full] [--exact] [--processes N] [--modes compiled,interpret,step] [--only NAME] [--blocks N] [--save FILE] [--compare FILE]
+# the programs are built straight from the blocks.py classes, so this runs headless like cli.py
+
+# LIBRARY IMPORTS #
+import argparse
+import contextlib
+import io
+import copy
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+# LOCAL MODULES #
+import blocks
+import profiler
+import runner
+import shared
+
+MODES = ["compiled", "interpret", "step"]
+RESULTS_PATH = "bench_results.json"
+REGRESSION_RATIO = 1.1 # this much slower than the old results gets flagged
+
+# PROGRAM BUILDING #
+# small helpers so the programs below read roughly like they would look in the editor
+def num(x):
+    return blocks.NumBlock(str(float(x)))
+
+def var(name):
+    return blocks.VarBlock(name)
+
+def fill(block, *items): # puts items into the block's slots in order
+    for i, item in enumerate(items):
+        block.slots[i] = item
+        item.parent = block
+    return block
+
+def op(factory, a, b):
+    return fill(factory(), a, b)
+
+def set_var(name, value):
+    return fill(blocks.SetBlock(), var(name), value)
+
+def inc(name):
+    return fill(blocks.IncBlock(), var(name))
+
+def if_block(cond, *children):
+    return fill(blocks.IfBlock(children = list(children)), cond)
+
+def while_block(cond, *children):
+    return fill(blocks.WhileBlock(children = list(children)), cond)
+
+def for_block(init, cond, step, *children):
+    return fill(blocks.ForBlock(children = list(children)), init, cond, step)
+
+def parallel(factory, name, lo, hi, target, *children): # target gets the reduction of what the iterations leave in it
+    return fill(factory(children = list(children)), var(name), lo, hi, var(target))
+
+def start(*children):
+    return blocks.StartBlock(list(children))
+
+def divides(a, b): # b % a == 0
+    return op(blocks.EqBlock, op(blocks.ModBlock, b, a), num(0))
+
+# LEVEL SOLUTIONS #
+# each one takes the size of the problem, at the level's own size 'goal' ends up holding the answer
+def level_1(_):
+    return [start(set_var("goal", op(blocks.AddBlock, num(5), op(blocks.MulBlock, num(5), num(5)))))]
+
+def level_2(n):
+    return [start(
+        set_var("n", num(n)), set_var("d", num(2)),
+        while_block(op(blocks.NEqBlock, op(blocks.ModBlock, var("n"), var("d")), num(0)), inc("d")),
+        set_var("goal", var("d")),
+    )]
+
+def level_3(limit):
+    return [start(
+        set_var("s", num(0)),
+        for_block(set_var("i", num(1)), op(blocks.LsBlock, var("i"), num(limit)), set_var("i", op(blocks.AddBlock, var("i"), num(2))),
+            set_var("s", op(blocks.AddBlock, var("s"), var("i")))),
+        set_var("goal", var("s")),
+    )]
+
+def level_4(limit):
+    return [start(
+        set_var("s", num(0)),
+        for_block(set_var("i", num(1)), op(blocks.LsBlock, var("i"), num(limit)), inc("i"),
+            if_block(op(blocks.OrBlock, divides(num(3), var("i")), divides(num(5), var("i"))),
+                set_var("s", op(blocks.AddBlock, var("s"), var("i"))))),
+        set_var("goal", var("s")),
+    )]
+
+def level_5(limit):
+    return [start(
+        set_var("a", num(1)), set_var("b", num(2)), set_var("s", num(0)),
+        while_block(op(blocks.LsBlock, var("a"), num(limit)),
+            if_block(divides(num(2), var("a")), set_var("s", op(blocks.AddBlock, var("s"), var("a")))),
+            set_var("t", op(blocks.AddBlock, var("a"), var("b"))),
+            set_var("a", var("b")),
+            set_var("b", var("t"))),
+        set_var("goal", var("s")),
+    )]
+
+def level_6(count): # trial division by odd numbers up to the square root
+    return [start(
+        set_var("found", num(1)), set_var("n", num(1)),
+        while_block(op(blocks.LsBlock, var("found"), num(count)),
+            set_var("n", op(blocks.AddBlock, var("n"), num(2))),
+            set_var("d", num(3)),
+            while_block(op(blocks.AndBlock, op(blocks.LsBlock, op(blocks.MulBlock, var("d"), var("d")), op(blocks.AddBlock, var("n"), num(1))),
+                    op(blocks.NEqBlock, op(blocks.ModBlock, var("n"), var("d")), num(0))),
+                set_var("d", op(blocks.AddBlock, var("d"), num(2)))),
+            if_block(op(blocks.GrBlock, op(blocks.MulBlock, var("d"), var("d")), var("n")), inc("found"))),
+        set_var("goal", var("n")),
+    )]
+
+def sieve(count): # level 6 with a sieve in an array, marks the multiples of every prime it finds
+    limit = int(count * (math.log(count) + math.log(math.log(count)))) + 10 # bound on the count-th prime
+    return [start(
+        set_var("sieve", fill(blocks.ArrayBlock(), num(limit))),
+        set_var("found", num(0)), set_var("n", num(2)),
+        while_block(op(blocks.LsBlock, var("found"), num(count)),
+            if_block(op(blocks.EqBlock, op(blocks.GetBlock, var("sieve"), var("n")), num(0)),
+                inc("found"),
+                set_var("m", op(blocks.MulBlock, var("n"), var("n"))),
+                while_block(op(blocks.LsBlock, var("m"), num(limit)),
+                    fill(blocks.PutBlock(), var("sieve"), var("m"), num(1)),
+                    set_var("m", op(blocks.AddBlock, var("m"), var("n"))))),
+            inc("n")),
+        set_var("goal", op(blocks.SubBlock, var("n"), num(1))),
+    )]
+
+def level_7(limit):
+    return [start(
+        set_var("best", num(0)), set_var("i", num(1)),
+        while_block(op(blocks.LsBlock, var("i"), num(limit)),
+            set_var("n", var("i")), set_var("c", num(0)),
+            while_block(op(blocks.NEqBlock, var("n"), num(1)),
+                set_var("e", divides(num(2), var("n"))),
+                if_block(var("e"), set_var("n", op(blocks.DivBlock, var("n"), num(2)))),
+                if_block(fill(blocks.NotBlock(), var("e")), set_var("n", op(blocks.AddBlock, op(blocks.MulBlock, var("n"), num(3)), num(1)))),
+                inc("c")),
+            if_block(op(blocks.GrBlock, var("c"), var("best")), set_var("best", var("c")), set_var("goal", var("i"))),
+            inc("i")),
+    )]
+
+def level_8(size): # C(2 * size, size), every partial product is a whole number
+    return [start(
+        set_var("c", num(1)),
+        for_block(set_var("i", num(1)), op(blocks.LsBlock, var("i"), num(size + 1)), inc("i"),
+            set_var("c", op(blocks.DivBlock, op(blocks.MulBlock, var("c"), op(blocks.AddBlock, num(size), var("i"))), var("i")))),
+        set_var("goal", var("c")),
+    )]
+
+def divsum(): # sum of the proper divisors of x
+    return blocks.FuncBlock("divsum", [
+        set_var("r", num(0)),
+        for_block(set_var("d", num(1)), op(blocks.LsBlock, op(blocks.MulBlock, var("d"), num(2)), op(blocks.AddBlock, var("x"), num(1))), inc("d"),
+            if_block(divides(var("d"), var("x")), set_var("r", op(blocks.AddBlock, var("r"), var("d"))))),
+        fill(blocks.RetBlock(), var("r")),
+    ])
+
+def level_9(limit): # uses a function for the divisor sums, so it covers calls too
+    return [divsum(), start(
+        set_var("total", num(0)),
+        for_block(set_var("a", num(2)), op(blocks.LsBlock, var("a"), num(limit)), inc("a"),
+            set_var("x", var("a")),
+            set_var("b", blocks.CallBlock("divsum")),
+            if_block(op(blocks.NEqBlock, var("a"), var("b")),
+                set_var("x", var("b")),
+                if_block(op(blocks.EqBlock, blocks.CallBlock("divsum"), var("a")), set_var("total", op(blocks.AddBlock, var("total"), var("a")))))),
+        set_var("goal", var("total")),
+    )]
+
+# the searches of levels 7 and 9 again, with their outer loops split between processes (see blocks.ParallelBlock)
+def parallel_7(limit):
+    return [start(
+        parallel(blocks.ParallelMaxBlock, "i", num(1), num(limit), "c",
+            set_var("n", var("i")), set_var("c", num(0)),
+            while_block(op(blocks.NEqBlock, var("n"), num(1)),
+                set_var("e", divides(num(2), var("n"))),
+                if_block(var("e"), set_var("n", op(blocks.DivBlock, var("n"), num(2)))),
+                if_block(fill(blocks.NotBlock(), var("e")), set_var("n", op(blocks.AddBlock, op(blocks.MulBlock, var("n"), num(3)), num(1)))),
+                inc("c"))),
+        set_var("goal", var("c")),
+    )]
+
+def parallel_9(limit):
+    return [divsum(), start(
+        parallel(blocks.ParallelSumBlock, "a", num(2), num(limit), "total",
+            set_var("x", var("a")),
+            set_var("b", blocks.CallBlock("divsum")),
+            if_block(op(blocks.NEqBlock, var("a"), var("b")),
+                set_var("x", var("b")),
+                if_block(op(blocks.EqBlock, blocks.CallBlock("divsum"), var("a")), set_var("total", var("a"))))),
+        set_var("goal", var("total")),
+    )]
+
+# MICRO BENCHMARKS #
+def loop(n):
+    return [start(set_var("i", num(0)), while_block(op(blocks.LsBlock, var("i"), num(n)), inc("i")), set_var("goal", var("i")))]
+
+def arithmetic(n): # long BOpBlock chain that depends on the loop variable, so nothing gets folded or hoisted
+    expr = var("i")
+    for k in range(1, 25):
+        factory = [blocks.AddBlock, blocks.MulBlock, blocks.SubBlock, blocks.DivBlock][k % 4]
+        expr = op(factory, expr, op(blocks.AddBlock, var("i"), num(k)))
+    return [start(
+        set_var("i", num(0)),
+        while_block(op(blocks.LsBlock, var("i"), num(n)), set_var("x", expr), inc("i")),
+        set_var("goal", var("i")),
+    )]
+
+def calls(n):
+    func = blocks.FuncBlock("step", [inc("count"), fill(blocks.RetBlock(), var("count"))])
+    return [func, start(
+        set_var("count", num(0)),
+        while_block(op(blocks.LsBlock, blocks.CallBlock("step"), num(n))),
+        set_var("goal", var("count")),
+    )]
+
+def variables(n): # rotates values through a handful of variables
+    names = ["a", "b", "c", "d", "e"]
+    body = [set_var("t", var(names[0]))]
+    body += [set_var(names[k], var(names[k + 1])) for k in range(len(names) - 1)]
+    body += [set_var(names[-1], var("t")), inc("i")]
+    return [start(
+        *[set_var(name, num(k)) for k, name in enumerate(names)], set_var("i", num(0)),
+        while_block(op(blocks.LsBlock, var("i"), num(n)), *body),
+        set_var("goal", var("a")),
+    )]
+
+def memo(n): # collatz lengths with a recursive function, which gets memoized (see blocks.Memo)
+    steps = blocks.FuncBlock("steps", [
+        set_var("c", num(0)),
+        set_var("e", divides(num(2), var("n"))),
+        if_block(op(blocks.NEqBlock, var("n"), num(1)),
+            if_block(var("e"), set_var("n", op(blocks.DivBlock, var("n"), num(2)))),
+            if_block(fill(blocks.NotBlock(), var("e")), set_var("n", op(blocks.AddBlock, op(blocks.MulBlock, var("n"), num(3)), num(1)))),
+            set_var("c", op(blocks.AddBlock, blocks.CallBlock("steps"), num(1)))),
+        fill(blocks.RetBlock(), var("c")),
+    ])
+    return [steps, start(
+        set_var("total", num(0)),
+        set_var("i", num(1)),
+        while_block(op(blocks.LsBlock, var("i"), num(n)), # not a for block, that would hide RecursionErrors
+            set_var("n", var("i")),
+            set_var("total", op(blocks.AddBlock, var("total"), blocks.CallBlock("steps"))),
+            inc("i")),
+        set_var("goal", var("total")),
+    )]
+
+def sequences(n): # sum of the squares of the even numbers below n, runs vectorized when numpy is there
+    evens = fill(blocks.FilterBlock(), var("x"), fill(blocks.RangeBlock(), num(0), num(n)), divides(num(2), var("x")))
+    squares = fill(blocks.MapBlock(), var("x"), evens, op(blocks.MulBlock, var("x"), var("x")))
+    return [start(set_var("goal", fill(blocks.SumBlock(), squares)))]
+
+def big_ints(n): # with --exact, ints too big for a float compared with floats. the others overflow to None
+    big = op(blocks.MulBlock, num(1e200), num(1e200))
+    rest = op(blocks.ModBlock, var("big"), op(blocks.AddBlock, var("big"), num(1)))
+    return [start(
+        set_var("big", big), set_var("hits", num(0)), set_var("i", num(0)),
+        while_block(op(blocks.LsBlock, var("i"), num(n)),
+            if_block(op(blocks.EqBlock, rest, num(0.5)), inc("hits")),
+            if_block(op(blocks.NEqBlock, rest, num(0.5)), inc("hits")),
+            inc("i")),
+        set_var("goal", var("hits")),
+    )]
+
+# (name, builder, default size, full size, level or None). levels only get checked at their full size
+CASES = [
+    ("level_1", level_1, None, None, 1),
+    ("level_2", level_2, 12345678, 12345678, 2),
+    ("level_3", level_3, 100, 100, 3),
+    ("level_4", level_4, 1000, 1000, 4),
+    ("level_5", level_5, 4000000, 4000000, 5),
+    ("level_6", level_6, 2000, 10001, 6),
+    ("sieve", sieve, 2000, 10001, 6),
+    ("level_7", level_7, 10000, 1000000, 7), # the full size takes hours
+    ("level_8", level_8, 20, 20, 8),
+    ("level_9", level_9, 1000, 10000, 9), # the expected value is the sum under 10000, not 1000 like the text says
+    ("parallel_7", parallel_7, 10000, 1000000, 7), # only runs in parallel compiled, the other modes go one by one
+    ("parallel_9", parallel_9, 1000, 10000, 9),
+    ("loop", loop, 500000, 5000000, None),
+    ("arithmetic", arithmetic, 20000, 200000, None),
+    ("calls", calls, 200000, 2000000, None),
+    ("variables", variables, 200000, 2000000, None),
+    ("memo", memo, 300, 1000, None), # deeper recursion than this runs out of Python stack
+    ("sequences", sequences, 100000, 1000000, None),
+    ("big_ints", big_ints, 20000, 200000, None),
+]
+
+# RUNNING #
+# runs a freshly built program once, returns (global_vars, seconds, ops, peak bytes)
+# ops are only counted by the step interpreter, peak memory only when tracing (which slows everything down)
+def run_case(builder, size, mode, trace = False):
+    blocks.global_fns = {} # FuncBlocks register themselves while building
+    global_blocks = builder(size)
+    ops = None
+    if trace:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "step":
+            blocks.global_vars = {}
+            ops = sum(1 for _ in runner.program_steps(global_blocks))
+        else:
+            runner.execute_program(global_blocks, mode)
+    seconds = time.perf_counter() - start_time
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return blocks.global_vars, seconds, ops, peak
+
+# times every mode of a case (best of repeat), returns {mode: result} and whether everything agreed
+def bench_case(case, modes, full, repeat, memory):
+    name, builder, size, full_size, level = case
+    size = full_size if full else size
+    results = {}
+    goals = set()
+    ops = None
+    for mode in modes:
+        best = None
+        for _ in range(repeat):
+            global_vars, seconds, mode_ops, _ = run_case(builder, size, mode)
+            best = seconds if best == None else min(best, seconds)
+            if mode_ops != None: ops = mode_ops
+        goals.add(repr(global_vars.get("goal")))
+        results[mode] = {"seconds": best}
+        if memory:
+            results[mode]["peak_kb"] = run_case(builder, size, mode, trace = True)[3] / 1024
+    if ops == None: # none of the modes counted them
+        ops = run_case(builder, size, "step")[2]
+    for result in results.values():
+        result["ops"] = ops
+        result["ops_per_sec"] = ops / result["seconds"] if result["seconds"] else 0.0
+
+    ok = len(goals) == 1 # every interpreter has to end up with the same answer
+    if level != None and size == full_size:
+        ok = ok and shared.check_level(level, global_vars)
+    return results, ok
+
+# MEMORY #
+# how much a big program takes while it's just sitting in the editor, and how long building, cloning and pickling it takes
+MEMORY_BLOCKS = 100000
+
+def big_program(count): # copies of the level 6 solution until there are at least count blocks
+    per_copy = len(profiler.program_blocks(level_6(10001)))
+    return [root for _ in range(-(-count // per_copy)) for root in level_6(10001)]
+
+def bench_memory(count):
+    tracemalloc.start()
+    program = big_program(count)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    program = None
+
+    start_time = time.perf_counter()
+    program = big_program(count)
+    build = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    copy.deepcopy(program) # what cloning does, see Game.clone
+    clone = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    data = runner.dump_program(program) # what starting a run does
+    dump = time.perf_counter() - start_time
+
+    count = len(profiler.program_blocks(program))
+    return {
+        "blocks": count,
+        "bytes_per_block": size / count,
+        "build_seconds": build,
+        "clone_seconds": clone,
+        "pickle_seconds": dump,
+        "pickle_kb": len(data) / 1024,
+    }
+
+def format_memory(result, old):
+    row = (f"{'memory':<12} {result['blocks']} blocks: {result['bytes_per_block']:.0f} B/block, build {result['build_seconds']:.3f}s, "
+        f"clone {result['clone_seconds']:.3f}s, pickle {result['pickle_seconds']:.3f}s ({result['pickle_kb']:.0f} KB)")
+    if old:
+        row += f"   x{result['bytes_per_block'] / old['bytes_per_block']:.2f} memory vs old"
+    return row
+
+# RESULTS #
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+def save_results(path, cases, memory, args):
+    data = {
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "full": args.full,
+        "exact": args.exact,
+        "processes": blocks.parallel_processes,
+        "cases": cases,
+    }
+    if memory:
+        data["memory"] = memory
+    with open(path, "w") as f:
+        json.dump(data, f, indent = 2)
+
+def format_row(name, mode, result, old):
+    row = f"{name:<12} {mode:<10} {result['seconds']:>9.3f}s {result['ops']:>10} {result['ops_per_sec']:>12.0f}/s"
+    if "peak_kb" in result:
+        row += f" {result['peak_kb']:>10.1f} KB"
+    if old: # compares throughput, so results of a different size still mean something
+        ratio = old["ops_per_sec"] / result["ops_per_sec"] if result["ops_per_sec"] else 1.0
+        row += f"   x{ratio:.2f} time vs old" + ("  REGRESSION" if ratio > REGRESSION_RATIO else "")
+    return row
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description = "Benchmark the PyBlocks interpreters on level solutions and micro benchmarks.")
+    parser.add_argument("--full", action = "store_true", help = "run every case at its full size (level 7 takes hours)")
+    parser.add_argument("--exact", action = "store_true", help = "run in exact integer mode, see blocks.exact_ints")
+    parser.add_argument("--processes", type = int, help = "processes Parallel blocks use, defaults to the number of cores")
+    parser.add_argument("--modes", default = ",".join(MODES), help = "comma separated interpreters to time")
+    parser.add_argument("--only", action = "append", help = "case to run, can be given more than once")
+    parser.add_argument("--repeat", type = int, default = 1, help = "runs per case and mode, the fastest one counts")
+    parser.add_argument("--no-memory", action = "store_true", help = "skip the (slow) tracemalloc runs for peak memory and block size")
+    parser.add_argument("--blocks", type = int, default = MEMORY_BLOCKS, help = "size of the program the memory benchmark builds")
+    parser.add_argument("--save", default = RESULTS_PATH, help = "where to write the results")
+    parser.add_argument("--compare", help = "earlier results file to compare against")
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+    modes = [mode for mode in args.modes.split(",") if mode]
+    for mode in modes:
+        if mode not in MODES:
+            print(f"unknown mode: {mode}")
+            return 2
+    cases = [case for case in CASES if not args.only or case[0] in args.only]
+    blocks.exact_ints = args.exact
+    blocks.parallel_processes = args.processes
+    old = load_results(args.compare) if args.compare else {}
+
+    results = {}
+    failed = []
+    for case in cases:
+        name = case[0]
+        results[name], ok = bench_case(case, modes, args.full, max(1, args.repeat), not args.no_memory)
+        if not ok: failed.append(name)
+        for mode, result in results[name].items():
+            print(format_row(name, mode, result, old.get("cases", {}).get(name, {}).get(mode)) + ("" if ok else "  WRONG RESULT"))
+
+    memory = None
+    if not args.no_memory and (not args.only or "memory" in args.only):
+        memory = bench_memory(args.blocks)
+        print(format_memory(memory, old.get("memory")))
+
+    save_results(args.save, results, memory, args)
+    print(f"results saved to {args.save}")
+    if failed:
+        print(f"wrong results: {', '.join(failed)}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
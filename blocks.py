@@ -2,10 +2,17 @@
 # since interpretation wasn't that complex, i put the interpreter code inside the classes themselves (execute() method)
 
 # LIBRARY IMPORTS #
+import array
+import collections
 import copy
 import math
+import multiprocessing
+import os
+import pickle
+numpy = None # optional, only makes the sequence blocks faster. imported once it's needed, see load_numpy
 
 # LOCAL MODULES #
+import console
 import shared
 
 # due to this class also being the interpreter, it was the best place to put these variables
@@ -13,31 +20,232 @@ import shared
 global_vars = {}
 # functions
 global_fns = {}
+# profiler.Profiler during profiled runs, wraps every closure get_compiled() builds with timing code
+profiler = None
+# console.Console that Print blocks write to, None prints to stdout (cli.py captures that)
+output = None
+# live.LiveCache during watch mode runs, wraps the closures of blocks it has caches for (after compile, before profiler)
+live = None
+# processes Parallel blocks split their iterations between, None uses every core and 1 runs them all in this process
+parallel_processes = None
+# process pool of the current run, started by the first Parallel block that needs it, see get_pool and close_pool
+pool = None
+# exact integer mode, whole number literals are ints and the operators keep ints exact (see parse_number)
+# compiled closures depend on it, so they have to be cleared when it changes
+exact_ints = False
+
+# COMPILER HELPERS #
+# every block can compile its subtree into a closure (compile() method), which skips the slot lookups and
+# isinstance checks execute() does every time. execute() is kept as the reference interpreter
+def _noop():
+    pass
+
+def _missing_slot():
+    raise KeyError # same error execute() runs into when indexing an empty slot
+
+# OPTIMIZER HELPERS #
+# compile() also optimizes: constant subtrees get folded, operators are specialized when the operand types are
+# known, blocks that can never run are dropped and loops hoist invariant expressions (hoist_invariants below).
+# none of this may change what a program does, execute() is still the reference
+
+# shared by BOpBlock and UOpBlock. operators catch every error, so a missing slot just makes them return None
+def fold_operator(block):
+    values = []
+    for i in range(block.slots_count):
+        if i not in block.slots: return (True, None)
+        is_const, value = block.slots[i].constant()
+        if not is_const: return (False, None)
+        values.append(value)
+    try:
+        return (True, block.oper(*values))
+    except: return (True, None)
+
+def operator_pure(block):
+    return all(item.is_pure() for item in block.slots.values())
+
+# operators with a numpy version in vector_ops, see SEQUENCES. an operator whose operands don't depend on the
+# elements is just evaluated once
+def vectorize_operator(block, name):
+    if block.constant()[0]: return BaseBlock.vectorize(block, name)
+    if len(block.slots) < block.slots_count or block.oper not in vector_ops: return None
+    parts = [block.slots[i].vectorize(name) for i in range(block.slots_count)]
+    if None in parts: return None
+    oper, vector = block.oper, vector_ops[block.oper]
+    def run(items):
+        values = [part(items) for part in parts]
+        if not any(isinstance(value, numpy.ndarray) for value in values):
+            return vector_scalar(oper(*values))
+        return vector(*values)
+    return run
+
+# types an operator result can have, None if unknown. NoneType is included whenever the operator can fail
+def operator_types(block):
+    if len(block.slots) < block.slots_count or block.oper not in op_types: return None
+    return op_types[block.oper](*(block.slots[i].value_types() for i in range(block.slots_count)))
+
+# pure expressions in a loop that only read variables the loop never assigns evaluate to the same thing every
+# iteration, so the expression's cached closure is replaced by one that evaluates it the first time it runs and
+# reads the stored value after that. the loop empties the stored values (the cells this returns) when it starts.
+# expressions that never run (in an If that's never true, or a loop that doesn't go round) never get evaluated,
+# so this can't make a loop slower. clear_compiled() undoes it once anything inside the loop changes
+def hoist_invariants(loop):
+    loop.unhoist()
+    written = loop.writes()
+    if written == None: return () # a function call could assign anything
+    found = []
+    pending = list(loop.nested())
+    while pending:
+        block = pending.pop()
+        if getattr(block.compiled, "hoisted", False): continue # already hoisted by a loop further out
+        if block.nested() and block.is_pure() and not block.constant()[0] and not block.reads() & written:
+            found.append(block)
+        else:
+            pending.extend(block.nested())
+    cells = []
+    for block in found:
+        cell = [] # holds the value once it got evaluated
+        fn = block.compile()
+        block.clear_compiled(loop) # whatever was compiled against the old closure
+        block.compiled = _hoisted_reader(cell, fn)
+        cells.append(cell)
+    loop.hoisted = tuple(found)
+    return tuple(cells)
+
+def _hoisted_reader(cell, fn):
+    def read():
+        if not cell:
+            cell.append(fn())
+        return cell[0]
+    read.hoisted = True
+    return read
 
 # BaseBlock is the root class, has children functionality
 class BaseBlock:
     default_valid_parent = True # determines if block can contain children
     default_valid_child = True # determines if block can be added as child or into slot
-    def __init__(self, label, color, children = []):
-        self.label = label
-        self.color = color
+    # block classes also have a default_label and default_color, so the insert menu doesn't have to make blocks
+    # caches and links that are rebuilt instead of copied (cloning uses deepcopy, the worker uses pickle)
+    transient = {
+        "parent": None, # block this one is a child or slot item of
+        "compiled": None, # cached result of compile(), cleared by invalidate()
+        "hoisted": (), # blocks in the subtree whose values this loop keeps while it runs, see hoist_invariants
+        # layout and rendering state, managed by graphics.py
+        "surface": None, # composed body surface, redrawn when dirty
+        "scaled": None, # (zoom, surface) drawn instead of surface while the camera is zoomed, see graphics.block_surface
+        "dirty": True,
+        "layout_dirty": True, # size/offsets of this block need recomputing, always true for its ancestors as well
+        "layout": None, # offsets relative to the block, see graphics.layout
+        "height": None, # cached abs_height()
+        "placed_pos": None, # pos the subtree was last positioned at
+        "moved": True, # layout changed since the subtree was last positioned
+        "commands": None, # (camera, draw commands) for the visible part of the tree, only used on root blocks
+        "heat": None, # (heat, execution count) from the last profiled run, shown by graphics.compose
+        "memo": None, # Memo of a function block, built together with its compiled closure
+        "live_cache": None, # what the last watch mode runs cached for the block, dropped by invalidate(), see live.py
+    }
+    # programs can have a lot of blocks, so they don't get a __dict__. every subclass has to declare __slots__ too,
+    # whatever is the same for all blocks of a class (label, color, slots_count, oper) is stored on the class
+    __slots__ = ("opacity", "size", "pos", "children", "valid_parent", "valid_child", *transient)
+    def __init__(self, children = ()):
         self.opacity = 255
         self.size = (200, 30) # will get filled in first iteration of rendering
         self.pos = (0, 0) # same here
-        self.children = children[:]
+        self.children = list(children) if self.default_valid_parent else () # shared by everything without children
         self.valid_parent = self.default_valid_parent
         self.valid_child = self.default_valid_child
+        for name, value in self.transient.items():
+            setattr(self, name, value)
+        for child in self.children:
+            child.parent = self
+
+    @property
+    def label(self):
+        return self.default_label
+
+    @property
+    def color(self):
+        return self.default_color
+
+    # copies and pickles leave out the transient attributes, they start over from their defaults
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in slot_names(type(self))}
+
+    def __setstate__(self, state):
+        for name, value in self.transient.items():
+            setattr(self, name, value)
+        for name, value in state.items():
+            setattr(self, name, value)
+        for child in self.children:
+            child.parent = self
 
     def add_child(self, child):
         if self.valid_parent and child.valid_child:
             self.children.append(child)
+            child.parent = self
+            self.invalidate()
+            self.mark_dirty()
+
+    # called when the block gets removed from whatever contains it
+    def detach(self):
+        if self.parent:
+            self.parent.invalidate()
+            self.parent.mark_dirty() # the slot it was in is empty again
+        self.parent = None
+        self.commands = None # might become a root block, which draws from its own commands
+
+    # anything that changes how the block looks (field, slots, children, opacity) has to call this
+    # the layout of everything containing it has to be redone too, since sizes depend on children and slot items
+    def mark_dirty(self):
+        self.dirty = True
+        block = self
+        while block and not block.layout_dirty:
+            block.layout_dirty = True
+            block.height = None
+            block = block.parent
 
-    # accounts for the 2px border
+    def set_opacity(self, opacity):
+        if opacity != self.opacity:
+            self.opacity = opacity
+            self.mark_dirty()
+
+    # throws away the compiled closures and watch mode caches of this block and everything containing it
+    def invalidate(self):
+        self.clear_compiled()
+        block = self
+        while block:
+            block.live_cache = None
+            block = block.parent
+
+    # same as invalidate(), but stops before reaching stop
+    def clear_compiled(self, stop = None):
+        block = self
+        while block and block is not stop:
+            block.compiled = None
+            block.unhoist()
+            block = block.parent
+
+    # gives hoisted expressions their own closures back, the stored values are only updated by this loop's closure
+    def unhoist(self):
+        hoisted, self.hoisted = self.hoisted, ()
+        for block in hoisted:
+            block.clear_compiled(self)
+
+    def get_compiled(self):
+        if self.compiled == None:
+            self.compiled = self.compile()
+            if live != None:
+                self.compiled = live.wrap(self, self.compiled)
+            if profiler != None:
+                self.compiled = profiler.wrap(self, self.compiled)
+        return self.compiled
+
+    # accounts for the 2px border, cached until mark_dirty() is called on the block or anything inside it
     def abs_height(self):
-        height = self.size[1] + 4
-        for child in self.children:
-            height += child.abs_height()
-        return height
+        if self.height == None:
+            self.height = self.size[1] + 4
+            for child in self.children:
+                self.height += child.abs_height()
+        return self.height
 
     def cleanup(self):
         pass # to be overridden (i didn't end up using this method for anything other than funcblocks)
@@ -45,31 +253,128 @@ class BaseBlock:
     def execute(self):
         pass # to be overridden by inheriting classes
 
+    # generator version of execute() for the step interpreter (runner.StepRun), yields once per executed block
+    # and returns the value execute() would. leaf blocks can't run for long, so by default they just execute
+    def steps(self):
+        yield
+        return self.execute()
+
+    def compile(self):
+        return _noop # to be overridden by inheriting classes, has to behave exactly like execute()
+
+    # compiled children, without the ones that do nothing
+    def compile_body(self):
+        return tuple(fn for fn in (child.get_compiled() for child in self.children) if fn is not _noop)
+
+    # every block directly inside this one
+    def nested(self):
+        return self.children
+
+    # this block and everything inside it
+    def subtree(self):
+        found = []
+        pending = [self]
+        while pending:
+            block = pending.pop()
+            found.append(block)
+            pending.extend(block.nested())
+        return found
+
+    # (True, value) if the block always evaluates to value, without side effects. (False, None) otherwise
+    def constant(self):
+        return (False, None)
+
+    # set of types the block can evaluate to, None if unknown. only known for blocks that can't raise
+    def value_types(self):
+        is_const, value = self.constant()
+        return {type(value)} if is_const else None
+
+    # true if evaluating the block has no side effects and can't raise, so it can be evaluated early
+    def is_pure(self):
+        return self.constant()[0]
+
+    # function evaluating the block for every element of a sequence at once, with the element variable name bound
+    # to the numpy array. None if the block doesn't have a vectorized version, see MapBlock
+    def vectorize(self, name):
+        is_const, value = self.constant()
+        if is_const and is_vector_scalar(value):
+            return lambda items: value
+        return None
+
+    # variables the subtree reads
+    def reads(self):
+        names = set()
+        for block in self.nested():
+            names |= block.reads()
+        return names
+
+    # variable this block itself assigns, if any
+    def assigns(self):
+        return None
+
+    # variables the subtree can assign, None if that can't be known (function calls)
+    def writes(self):
+        names = set() if self.assigns() == None else {self.assigns()}
+        for block in self.nested():
+            written = block.writes()
+            if written == None: return None
+            names |= written
+        return names
+
+
+# every slot of a block class that isn't transient, cached per class
+_slot_names = {}
+def slot_names(cls):
+    if cls not in _slot_names:
+        _slot_names[cls] = [name for base in cls.__mro__ for name in getattr(base, "__slots__", ()) if name not in BaseBlock.transient]
+    return _slot_names[cls]
+
 
 # SlotBlock class implements slot functionality into BaseBlcok
 class SlotBlock(BaseBlock):
-    def __init__(self, label, color, slots_count, slots = {}, children = []):
-        super().__init__(label, color, children)
-        self.slots_count = slots_count
-        self.slots = copy.deepcopy(slots)
-        self.slots_pos = {}
+    slots_count = 0 # set by every subclass
+    __slots__ = ("slots", "slots_pos")
+    def __init__(self, slots = None, children = ()):
+        super().__init__(children)
+        self.slots = copy.deepcopy(slots) if slots else {}
+        self.slots_pos = None # {slot index: pos}, made by graphics.place once the block is laid out
+        for item in self.slots.values():
+            item.parent = self
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        for item in self.slots.values():
+            item.parent = self
 
     def fill_slot(self, ghost, pos): # fill in the slot that was clicked on, if any. return true if success
         if not ghost.valid_child: return False
-        for i, spos in self.slots_pos.items():
+        for i, spos in (self.slots_pos or {}).items():
             if i not in self.slots and shared.check_collision(spos, (self.size[1],) * 2, pos):
                 ghost.children = []
                 ghost.valid_parent = False
+                ghost.invalidate()
+                ghost.mark_dirty()
+                ghost.parent = self
                 self.slots[i] = ghost
+                self.invalidate()
+                self.mark_dirty()
                 return True
         return False
 
+    # compiled closure of a slot item, empty slots raise like they do in execute()
+    def compile_slot(self, i):
+        return self.slots[i].get_compiled() if i in self.slots else _missing_slot
+
+    def nested(self):
+        return [*self.children, *self.slots.values()]
+
 
 # FieldBlocks contain a text field for input
 class FieldBlock(BaseBlock):
     default_valid_parent = False
-    def __init__(self, label, color, field = "", children = []):
-        super().__init__(label, color, children)
+    __slots__ = ("field", "field_ps")
+    def __init__(self, field = "", children = ()):
+        super().__init__(children)
         self.field = field
         self.field_ps = None
 
@@ -79,81 +384,252 @@ class FieldBlock(BaseBlock):
     def execute(self): # simply return the text
         return self.field
 
+    def compile(self):
+        field = self.field
+        return lambda: field
+
+    def constant(self):
+        return (True, self.field)
+
 # just a more specific class, no different functionality. 
 class TextBlock(FieldBlock):
-    def __init__(self, field="text"):
-        super().__init__("Text", (52, 152, 219), field, [])
+    default_label = "Text"
+    default_color = (52, 152, 219)
+    __slots__ = ()
+    def __init__(self, field = "text"):
+        super().__init__(field)
 
 # FieldBlock which only accepts numbers
 class NumBlock(FieldBlock):
+    default_label = "Num"
+    default_color = (52, 152, 219)
+    __slots__ = ()
     def __init__(self, field = "0.0"):
-        super().__init__("Num", (52, 152, 219), field, [])
+        super().__init__(field)
 
     def validate(self):
         filtered = ''.join(filter(lambda c: c.isdigit() or c == ".", self.field))
         if not filtered: filtered = "0.0"
-        self.field = str(float(filtered))
+        whole, _, frac = filtered.partition(".")
+        # whole numbers keep all their digits, str(float()) would turn big ones into 1.2345e+20
+        self.field = f"{int(whole)}.0" if whole.isdecimal() and not frac.strip("0") else str(float(filtered))
 
     def execute(self):
-        return float(self.field)
+        return parse_number(self.field)
+
+    def compile(self):
+        is_const, value = self.constant() # parsed once instead of every execution
+        if not is_const: return self.execute # fail at run time like execute() would
+        return lambda: value
+
+    def constant(self):
+        try:
+            return (True, parse_number(self.field))
+        except ValueError:
+            return (False, None)
+
+# value of a number literal, a float unless exact_ints is on and it's a whole number
+def parse_number(text):
+    if not exact_ints: return float(text)
+    whole, _, frac = text.partition(".")
+    if whole.isdecimal() and not frac.strip("0"): return int(whole) # not through float, big numbers stay exact
+    value = float(text)
+    return int(value) if value.is_integer() else value
 
 
 # blocks for boolean values
 class TrueBlock(BaseBlock):
     default_valid_parent = False
-    def __init__(self):
-        super().__init__("True", (41, 128, 185), [])
+    default_label = "True"
+    default_color = (41, 128, 185)
+    __slots__ = ()
 
     def execute(self):
         return True
 
+    def compile(self):
+        return lambda: True
+
+    def constant(self):
+        return (True, True)
+
 class FalseBlock(BaseBlock):
     default_valid_parent = False
-    def __init__(self):
-        super().__init__("False", (41, 128, 185), [])
+    default_label = "False"
+    default_color = (41, 128, 185)
+    __slots__ = ()
 
     def execute(self):
         return False
 
+    def compile(self):
+        return lambda: False
+
+    def constant(self):
+        return (True, False)
+
 
 # StartBlocks in global_blocks get executed first, entry point block
 class StartBlock(BaseBlock):
     default_valid_child = False
-    def __init__(self, children = []):
-        super().__init__("Start", (46, 204, 113), children)
+    default_label = "Start"
+    default_color = (46, 204, 113)
+    __slots__ = ()
 
     def execute(self): # execute all children
         for child in self.children:
             child.execute()
 
+    def steps(self):
+        yield
+        for child in self.children:
+            yield from child.steps()
+
+    def compile(self):
+        body = self.compile_body()
+        def run():
+            for fn in body:
+                fn()
+        return run
+
+
+# what Print blocks do with a value, going through output instead of print() keeps long loops from waiting on stdout
+def write_output(value):
+    if output == None:
+        print(value_str(value))
+    else:
+        output.write(value_str(value))
 
 # PrintBlocks just print the result of the first slot
 class PrintBlock(SlotBlock):
     default_valid_parent = False
-    def __init__(self, slots = {}):
-        super().__init__("Print", (52, 73, 94), 1, slots, [])
+    default_label = "Print"
+    default_color = (52, 73, 94)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         if 0 in self.slots:
-            print(self.slots[0].execute())
+            write_output(self.slots[0].execute())
+
+    def steps(self):
+        yield
+        if 0 in self.slots:
+            write_output((yield from self.slots[0].steps()))
+
+    def compile(self):
+        if 0 not in self.slots: return _noop
+        value = self.slots[0].get_compiled()
+        return lambda: write_output(value())
 
 # used inside function blocks
 class RetBlock(SlotBlock):
-    def __init__(self, slots = {}):
-        super().__init__("Return", (52, 73, 94), 1, slots, [])
+    default_label = "Return"
+    default_color = (52, 73, 94)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         if 0 in self.slots:
             return self.slots[0].execute()
 
+    def steps(self):
+        yield
+        if 0 in self.slots:
+            return (yield from self.slots[0].steps())
+
+    def compile(self):
+        if 0 not in self.slots: return _noop
+        return self.slots[0].get_compiled()
+
+
+# MEMOIZATION #
+# a function's result only depends on the variables its body reads, so calls that find the same values in all of
+# them can reuse an earlier result. whatever the body assigned gets replayed from the cache too, see FuncBlock.memo_vars
+MEMO_SIZE = 4096 # cached calls per function, the least recently used ones get dropped first
+MEMO_TRIAL = 1000 # inferred memos turn themselves off if less than a tenth of this many calls hit
+# stands in for variables that don't exist (yet). pickles as a reference to _unset, so the caches the worker
+# sends back in watch mode (see live.py) still use the same object
+class _Unset:
+    def __reduce__(self):
+        return "_unset"
+_unset = _Unset()
+
+# one variable's part of a memo key. 1.0 == True and 0.0 == -0.0 but they don't print or behave the same,
+# so the type and the sign of zeros are part of the key as well
+def _memo_value(value):
+    if type(value) is float and value == 0:
+        return (float, value, math.copysign(1.0, value))
+    return (type(value), value)
+
+# cache of one function's calls, built together with its compiled closure
+class Memo:
+    def __init__(self, block, keys, restores, adaptive = True, size = MEMO_SIZE):
+        self.block = block
+        self.keys = keys # variables the result depends on
+        self.restores = restores # variables the body can assign
+        self.adaptive = adaptive
+        self.size = size
+        self.cache = collections.OrderedDict() # key -> (result, values of restores after the call), oldest first
+        self.active = True
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0 # calls that involved unhashable values
+
+    def wrap(self, run):
+        keys, restores, cache = self.keys, self.restores, self.cache
+        def memoized():
+            key = tuple(_memo_value(global_vars.get(name, _unset)) for name in keys)
+            try:
+                entry = cache.get(key)
+            except TypeError: # unhashable value
+                self.uncached += 1
+                return run()
+            if entry != None:
+                self.hits += 1
+                cache.move_to_end(key)
+                result, values = entry
+                for name, value in zip(restores, values):
+                    if value is _unset:
+                        global_vars.pop(name, None)
+                    else:
+                        global_vars[name] = value
+                return result
+
+            self.misses += 1
+            result = run()
+            entry = (result, tuple(global_vars.get(name, _unset) for name in restores))
+            try:
+                hash(entry) # mutable values can't be handed out to more than one call
+            except TypeError:
+                return result
+            cache[key] = entry
+            if len(cache) > self.size:
+                cache.popitem(last = False)
+            if self.adaptive and self.misses == MEMO_TRIAL and self.hits * 10 < MEMO_TRIAL:
+                self.active = False
+                cache.clear()
+                # calls skip the memo from now on, editing the function compiles it with a new one
+                if self.block.memo is self:
+                    self.block.compiled = run if profiler == None else profiler.wrap(self.block, run)
+            return result
+        return memoized
+
+    def stats(self):
+        state = "" if self.active else ", turned off"
+        return f"{self.hits} hits, {self.misses} misses, {self.uncached} uncached, {len(self.cache)} cached{state}"
 
 # really basic function implementation, no paramters support (although you can use variables to emulate)
 class FuncBlock(FieldBlock):
     default_valid_parent = True
     default_valid_child = False
-    def __init__(self, field = "func", children = []):
-        super().__init__("Function", (230, 126, 34), field, children)
+    default_label = "Function"
+    default_color = (230, 126, 34)
+    __slots__ = ("prev_field", "cacheable")
+    def __init__(self, field = "func", children = ()):
+        super().__init__(field, children)
         self.prev_field = field
+        self.cacheable = None # memoize calls: None infers it from the body, True always does, False never does
         global_fns[self.field] = self
 
     def validate(self):
@@ -173,10 +649,81 @@ class FuncBlock(FieldBlock):
             if isinstance(child, RetBlock):
                 return val
 
+    def steps(self):
+        yield
+        for child in self.children:
+            val = yield from child.steps()
+            if isinstance(child, RetBlock):
+                return val
+
+    # children that run when the function gets called, everything after the first return block is unreachable
+    def body(self):
+        for i, child in enumerate(self.children):
+            if isinstance(child, RetBlock):
+                return self.children[:i + 1]
+        return self.children
+
+    # cycled through by middle clicking the block
+    def cycle_cacheable(self):
+        self.cacheable = {None: True, True: False, False: None}[self.cacheable]
+        self.invalidate()
+        self.mark_dirty()
+
+    # (variables the result depends on, variables the body can assign) if calls can be memoized, None otherwise
+    # inferred functions can't print, change arrays or call other functions. forced ones are trusted to only depend on their own
+    # variables, whatever they print or call. the key leaves out variables that get assigned before they're read
+    def memo_vars(self):
+        if self.cacheable == False: return None
+        body = self.body()
+        found = [block for child in body for block in child.subtree()]
+        if self.cacheable == None:
+            for block in found:
+                if isinstance(block, (PrintBlock, ArrayOpBlock)) or isinstance(block, CallBlock) and block.field != self.field:
+                    return None
+
+        # a call of the function itself doesn't add anything, the variables its own key is made of are either
+        # unchanged, assigned from the key of this call or part of it
+        written = {block.assigns() for block in found} - {None}
+        exposed, killed = set(), set() # read before being assigned, always assigned by the blocks so far
+        for child in body:
+            parts = [child]
+            if isinstance(child, ForBlock) and 0 in child.slots: # its first slot runs before anything else
+                parts.insert(0, child.slots[0])
+            for part in parts:
+                exposed |= part.reads() - killed
+                # a loop's first slot erroring ends the loop, not the function, so it only counts if it can't fail
+                if isinstance(part, SetBlock) and part.assigns() != None and (part is child or part.slots[1].is_pure()):
+                    killed.add(part.assigns())
+        return (tuple(sorted(exposed | (written - killed))), tuple(sorted(written)))
+
+    def compile(self):
+        body = []
+        ret = _noop
+        for child in self.body():
+            fn = child.get_compiled()
+            if isinstance(child, RetBlock):
+                ret = fn
+            elif fn is not _noop:
+                body.append(fn)
+        body = tuple(body)
+        def run():
+            for fn in body:
+                fn()
+            return ret()
+        memo_vars = self.memo_vars()
+        self.memo = None if memo_vars == None else Memo(self, *memo_vars, adaptive = self.cacheable == None)
+        return run if self.memo == None else self.memo.wrap(run)
+
+    def constant(self):
+        return (False, None)
+
 # block that is used to call functions
 class CallBlock(FieldBlock):
+    default_label = "Call"
+    default_color = (211, 84, 0)
+    __slots__ = ()
     def __init__(self, field = "func"):
-        super().__init__("Call", (211, 84, 0), field, [])
+        super().__init__(field)
 
     def validate(self):
         if not self.field:
@@ -186,19 +733,65 @@ class CallBlock(FieldBlock):
         if self.field in global_fns and global_fns[self.field] != None:
             return global_fns[self.field].execute()
 
+    def steps(self):
+        yield
+        if self.field in global_fns and global_fns[self.field] != None:
+            return (yield from global_fns[self.field].steps())
+
+    def compile(self):
+        name = self.field
+        def run(): # functions get looked up when called, since they can be renamed or deleted
+            fn = global_fns.get(name)
+            if fn != None:
+                return fn.get_compiled()()
+        return run
+
+    def constant(self):
+        return (False, None)
+
+    def writes(self):
+        return None # whatever the function assigns, which can change without this block knowing
+
 # control flow blocks
 class IfBlock(SlotBlock):
-    def __init__(self, slots = {}, children = []):
-        super().__init__("If", (241, 196, 15), 1, slots, children)
+    default_label = "If"
+    default_color = (241, 196, 15)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         if 0 in self.slots and self.slots[0].execute():
             for child in self.children:
                 child.execute()
 
+    def steps(self):
+        yield
+        if 0 in self.slots and (yield from self.slots[0].steps()):
+            for child in self.children:
+                yield from child.steps()
+
+    def compile(self):
+        if 0 not in self.slots: return _noop
+        is_const, value = self.slots[0].constant()
+        if is_const and not value: return _noop # body can never run
+        cond = self.slots[0].get_compiled()
+        body = self.compile_body()
+        if is_const:
+            def run():
+                for fn in body:
+                    fn()
+        else:
+            def run():
+                if cond():
+                    for fn in body:
+                        fn()
+        return run
+
 class WhileBlock(SlotBlock):
-    def __init__(self, slots = {}, children = []):
-        super().__init__("While", (241, 196, 15), 1, slots, children)
+    default_label = "While"
+    default_color = (241, 196, 15)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         if 0 in self.slots:
@@ -206,9 +799,33 @@ class WhileBlock(SlotBlock):
                 for child in self.children:
                     child.execute()
 
+    def steps(self):
+        yield
+        if 0 in self.slots:
+            while (yield from self.slots[0].steps()):
+                for child in self.children:
+                    yield from child.steps()
+
+    def compile(self):
+        if 0 not in self.slots: return _noop
+        is_const, value = self.slots[0].constant()
+        if is_const and not value: return _noop # body can never run
+        hoisted = hoist_invariants(self) # has to come first, so the closures below use the hoisted values
+        cond = self.slots[0].get_compiled()
+        body = self.compile_body()
+        def run():
+            for cell in hoisted:
+                cell.clear()
+            while cond():
+                for fn in body:
+                    fn()
+        return run
+
 class ForBlock(SlotBlock):
-    def __init__(self, slots = {}, children = []):
-        super().__init__("For", (241, 196, 15), 3, slots, children)
+    default_label = "For"
+    default_color = (241, 196, 15)
+    slots_count = 3
+    __slots__ = ()
 
     def execute(self):
         try:
@@ -219,10 +836,293 @@ class ForBlock(SlotBlock):
                 self.slots[2].execute()
         except: pass
 
+    def steps(self):
+        yield
+        try:
+            yield from self.slots[0].steps()
+            while (yield from self.slots[1].steps()):
+                for child in self.children:
+                    yield from child.steps()
+                yield from self.slots[2].steps()
+        except GeneratorExit: raise # the bare except below must not swallow the generator being closed
+        except: pass
+
+    def compile(self):
+        is_const, value = self.slots[1].constant() if 1 in self.slots else (False, None)
+        if is_const and not value: # only the first slot ever runs
+            init = self.compile_slot(0)
+            def run():
+                try:
+                    init()
+                except: pass
+            return run
+        hoisted = hoist_invariants(self)
+        init, cond, step = self.compile_slot(0), self.compile_slot(1), self.compile_slot(2)
+        body = self.compile_body()
+        def run():
+            try:
+                for cell in hoisted:
+                    cell.clear()
+                init()
+                while cond():
+                    for fn in body:
+                        fn()
+                    step()
+            except: pass
+        return run
+
+# PARALLEL LOOPS #
+# Parallel blocks run their body for every whole number from start up to stop (not included), split into chunks
+# that run in a process pool. every iteration starts from a copy of the variables as they were before the block,
+# so iterations can't see each other's changes and the block leaves every variable besides the target as it was.
+# whatever an iteration left in the target variable gets combined into the target by the subclass (sum, count,
+# max by). changes to arrays from outside the block only stay within the chunk that made them, don't rely on them
+PARALLEL_CHUNKS = 4 # chunks per process, so processes that got the quicker chunks pick up more of them
+PARALLEL_MIN = 64 # fewer iterations than this aren't worth starting processes for
+
+# the pool gets started once per run and reused by every Parallel block in it, runner.execute_program closes it
+# its processes start fresh (forkserver or spawn) instead of forking the run, which would copy whatever locks the
+# run's other threads (like the worker's snapshot thread) hold at that moment
+def get_pool(processes):
+    global pool
+    if pool == None:
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        pool = context.Pool(processes)
+    return pool
+
+def close_pool():
+    global pool
+    if pool != None:
+        pool.terminate()
+        pool.join()
+        pool = None
+
+# entry point of pool processes, runs one chunk on its own copy of the program and variables
+def parallel_chunk(task):
+    global global_vars, global_fns, exact_ints, profiler, live, output, parallel_processes
+    data, lo, hi = task
+    block, global_vars, global_fns, exact_ints, has_console = pickle.loads(data)
+    profiler = live = None # the parent process times and caches the block as a whole
+    parallel_processes = 1 # Parallel blocks in the body run in this process
+    # printed lines go back with the result, in order. without a console the parent prints all of them
+    output = console.Console() if has_console else console.Console(size = None)
+    result = block.run_chunk(lo, hi, *block.compile_iteration())
+    return result, output.take()
+
+class ParallelBlock(SlotBlock):
+    default_color = (243, 156, 18)
+    slots_count = 4 # loop variable, start, stop, target variable
+    __slots__ = ()
+
+    # missing slots or variable slots without Vars make it do nothing
+    def assigns(self):
+        if len(self.slots) == 4 and isinstance(self.slots[0], VarBlock) and isinstance(self.slots[3], VarBlock):
+            return self.slots[3].field
+
+    # the iterations read the variables from before the block, besides the two it sets for them
+    def reads(self):
+        if self.assigns() == None: return set()
+        body = set()
+        for child in self.children:
+            body |= child.reads()
+        return self.slots[1].reads() | self.slots[2].reads() | (body - {self.slots[0].field, self.assigns()})
+
+    # the body's assignments don't outlive the block, but loops around it mustn't hoist anything out of the body
+    def writes(self):
+        written = super().writes()
+        if written == None or self.assigns() == None: return written
+        return written | {self.slots[0].field}
+
+    # start and stop have to be whole numbers
+    def bounds(self, start, stop):
+        if not is_whole(start) or not is_whole(stop): raise ValueError("bounds aren't whole numbers")
+        return int(start), int(stop)
+
+    # runs iterations lo up to hi with body (which runs the children), returns what the subclass made of them
+    # the hoisted blocks of the prelude don't depend on anything the iterations change, so they get evaluated at
+    # most once per chunk (see hoist_invariants)
+    def run_chunk(self, lo, hi, body, prelude = ()):
+        global global_vars
+        name, target = self.slots[0].field, self.assigns()
+        base = global_vars
+        base.pop(target, None)
+        for cell in prelude:
+            cell.clear()
+        result = self.begin()
+        try:
+            for i in range(lo, hi):
+                global_vars = dict(base)
+                global_vars[name] = i if exact_ints else float(i)
+                body()
+                result = self.add(result, i, global_vars.get(target, _unset))
+        finally:
+            global_vars = base
+        return result
+
+    # the same in this process, on a copy of the variables like the pool processes get
+    def run_copy(self, lo, hi, body, prelude = ()):
+        global global_vars
+        saved = global_vars
+        global_vars = copy.deepcopy(saved)
+        try:
+            return self.run_chunk(lo, hi, body, prelude)
+        finally:
+            global_vars = saved
+
+    # combines the chunks in order, and merge() doesn't depend on where the range got split, so the result is the
+    # same as running them one after another in this process
+    def run_parallel(self, lo, hi, body, prelude):
+        processes = parallel_processes or os.cpu_count() or 1
+        if processes < 2 or hi - lo < PARALLEL_MIN:
+            return self.run_copy(lo, hi, body, prelude)
+        data = pickle.dumps((self, global_vars, global_fns, exact_ints, output != None))
+        count = processes * PARALLEL_CHUNKS
+        edges = [lo + (hi - lo) * k // count for k in range(count + 1)]
+        tasks = [(data, a, b) for a, b in zip(edges, edges[1:]) if a < b]
+        try:
+            chunk_pool = get_pool(processes)
+        except Exception: # can't start processes here (resource limits, daemonic process), so it runs in this one
+            return self.run_copy(lo, hi, body, prelude)
+        chunks = chunk_pool.map(parallel_chunk, tasks, chunksize = 1)
+        result = self.begin()
+        for part, (lines, dropped) in chunks:
+            result = self.merge(result, part)
+            if output != None:
+                output.extend(lines, dropped)
+            else:
+                for line in lines:
+                    print(line)
+        return result
+
+    # (closure running the children once, prelude), with what doesn't change between iterations hoisted like loops do
+    def compile_iteration(self):
+        prelude = hoist_invariants(self)
+        body = self.compile_body()
+        def run():
+            for fn in body:
+                fn()
+        return run, prelude
+
+    def finish(self, result):
+        value = self.result(result)
+        if value is _unset:
+            global_vars.pop(self.assigns(), None)
+        else:
+            global_vars[self.assigns()] = value
+
+    def execute(self):
+        if self.assigns() == None: return
+        try:
+            lo, hi = self.bounds(self.slots[1].execute(), self.slots[2].execute())
+            def body():
+                for child in self.children:
+                    child.execute()
+            self.finish(self.run_copy(lo, hi, body))
+        except: pass
+
+    # runs in this process, one iteration after another
+    def steps(self):
+        global global_vars
+        yield
+        if self.assigns() == None: return
+        try:
+            lo, hi = self.bounds((yield from self.slots[1].steps()), (yield from self.slots[2].steps()))
+            name, target = self.slots[0].field, self.assigns()
+            saved = global_vars
+            base = copy.deepcopy(saved)
+            base.pop(target, None)
+            result = self.begin()
+            try:
+                for i in range(lo, hi):
+                    global_vars = dict(base)
+                    global_vars[name] = i if exact_ints else float(i)
+                    for child in self.children:
+                        yield from child.steps()
+                    result = self.add(result, i, global_vars.get(target, _unset))
+            finally:
+                global_vars = saved
+            self.finish(result)
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        if self.assigns() == None: return _noop
+        start, stop = self.compile_slot(1), self.compile_slot(2)
+        body, prelude = self.compile_iteration()
+        def run():
+            try:
+                lo, hi = self.bounds(start(), stop())
+                self.finish(self.run_parallel(lo, hi, body, prelude))
+            except: pass
+        return run
+
+# numbers only, bools and anything else an iteration leaves in the target get skipped
+def is_number(value):
+    return type(value) in (float, int)
+
+FLOAT_SCALE = 1074 # every finite float is a whole multiple of 2 ** -1074
+
+# adds up the numbers the iterations leave in the target. floats get added exactly (as whole multiples of
+# 2 ** -1074) and rounded once at the end like math.fsum, so how the range got split into chunks can't change
+# the rounding. the total is (ints, finite floats times 2 ** 1074, infinities and nans, whether there were floats)
+class ParallelSumBlock(ParallelBlock):
+    default_label = "Parallel Sum"
+    __slots__ = ()
+
+    def begin(self): return (0, 0, 0.0, False)
+    def add(self, total, i, value):
+        ints, scaled, special, floats = total
+        if type(value) == int:
+            return (ints + value, scaled, special, floats)
+        if type(value) != float:
+            return total
+        if not math.isfinite(value):
+            return (ints, scaled, special + value, True)
+        n, d = value.as_integer_ratio() # d is a power of two up to 2 ** 1074
+        return (ints, scaled + (n << FLOAT_SCALE) // d, special, True)
+    def merge(self, a, b): return (a[0] + b[0], a[1] + b[1], a[2] + b[2], a[3] or b[3])
+    def result(self, total):
+        ints, scaled, special, floats = total
+        if exact_ints and not floats: return ints
+        exact = (ints << FLOAT_SCALE) + scaled
+        try:
+            value = exact / (1 << FLOAT_SCALE) # int division rounds correctly
+        except OverflowError: # adding up floats one by one would've ended at infinity as well
+            value = math.inf if exact > 0 else -math.inf
+        return value + special
+
+# counts the iterations that leave something true in the target
+class ParallelCountBlock(ParallelBlock):
+    default_label = "Parallel Count"
+    __slots__ = ()
+
+    def begin(self): return 0
+    def add(self, count, i, value): return count + 1 if value is not _unset and value else count
+    def merge(self, a, b): return a + b
+    def result(self, count): return float(count)
+
+# the loop value whose iteration left the largest number in the target, the first one if there's a tie
+class ParallelMaxBlock(ParallelBlock):
+    default_label = "Parallel Max By"
+    __slots__ = ()
+
+    def begin(self): return None # (largest number, loop value)
+    def add(self, best, i, value): # nan isn't larger or smaller than anything, so it doesn't count
+        if is_number(value) and value == value and (best == None or value > best[0]):
+            return (value, i if exact_ints else float(i))
+        return best
+    def merge(self, a, b): return b if a == None or b != None and b[0] > a[0] else a
+    def result(self, best): return _unset if best == None else best[1] # nothing to pick from leaves it unset
+
+
 # variable block
 class VarBlock(FieldBlock):
-    def __init__(self, field="a"):
-        super().__init__("Var", (192, 57, 43), field, [])
+    default_label = "Var"
+    default_color = (192, 57, 43)
+    __slots__ = ()
+    def __init__(self, field = "a"):
+        super().__init__(field)
 
     def validate(self):
         if not self.field:
@@ -232,64 +1132,258 @@ class VarBlock(FieldBlock):
         if self.field in global_vars:
             return global_vars[self.field]
 
+    def compile(self):
+        name = self.field
+        return lambda: global_vars.get(name)
+
+    def constant(self):
+        return (False, None)
+
+    def is_pure(self):
+        return True
+
+    def reads(self):
+        return {self.field}
+
+    def vectorize(self, name):
+        if self.field == name:
+            return lambda items: items
+        field = self.field
+        return lambda items: vector_scalar(global_vars.get(field))
+
 # SetBlocks are used to assign and define variables
 class SetBlock(SlotBlock):
     default_valid_parent = False
-    def __init__(self, slots = {}):
-        super().__init__("Set", (231, 76, 60), 2, slots, [])
+    default_label = "Set"
+    default_color = (231, 76, 60)
+    slots_count = 2
+    __slots__ = ()
 
     def execute(self):
         if 0 in self.slots and 1 in self.slots:
             if isinstance(self.slots[0], VarBlock):
                 global_vars[self.slots[0].field] = self.slots[1].execute()
 
+    def steps(self):
+        yield
+        if 0 in self.slots and 1 in self.slots:
+            if isinstance(self.slots[0], VarBlock):
+                global_vars[self.slots[0].field] = yield from self.slots[1].steps()
+
+    def compile(self):
+        if not (0 in self.slots and 1 in self.slots and isinstance(self.slots[0], VarBlock)): return _noop
+        name, value = self.slots[0].field, self.slots[1].get_compiled()
+        def run():
+            global_vars[name] = value()
+        return run
+
+    # only assigns when both slots are filled, and never reads the variable it assigns
+    def assigns(self):
+        if 0 in self.slots and 1 in self.slots and isinstance(self.slots[0], VarBlock):
+            return self.slots[0].field
+
+    def reads(self):
+        return self.slots[1].reads() if self.assigns() != None else set()
+
 
 # binary operator class for more code reusability
 class BOpBlock(SlotBlock):
     default_valid_parent = False
-    def __init__(self, label, oper):
-        super().__init__(label, (155, 89, 182), 2, {}, [])
-        self.oper = oper
+    default_color = (155, 89, 182)
+    slots_count = 2
+    __slots__ = ()
 
     def execute(self):
         try:
             return self.oper(self.slots[0].execute(), self.slots[1].execute())
         except: pass
 
-AddBlock = lambda: BOpBlock("+", lambda a, b: a + b)
-SubBlock = lambda: BOpBlock("-", lambda a, b: a - b)
-MulBlock = lambda: BOpBlock("x", lambda a, b: a * b)
-DivBlock = lambda: BOpBlock("/", lambda a, b: a / b)
-ModBlock = lambda: BOpBlock("%", lambda a, b: float(int(a) % int(b)))
-EqBlock = lambda: BOpBlock("=", lambda a, b: math.isclose(a, b) if isinstance(a, float) and isinstance(b, float) else a == b)
-NEqBlock = lambda: BOpBlock("!=", lambda a, b: (not math.isclose(a, b)) if isinstance(a, float) and isinstance(b, float) else a != b)
-GrBlock = lambda: BOpBlock(">", lambda a, b: a > b)
-LsBlock = lambda: BOpBlock("<", lambda a, b: a < b)
-AndBlock = lambda: BOpBlock("&&", lambda a, b: a and b)
-OrBlock = lambda: BOpBlock("||", lambda a, b: a or b)
+    def steps(self):
+        yield
+        try:
+            return self.oper((yield from self.slots[0].steps()), (yield from self.slots[1].steps()))
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        is_const, value = self.constant()
+        if is_const: return lambda: value # folded
+        oper, a, b = self.oper, self.compile_slot(0), self.compile_slot(1)
+        if 0 in self.slots and 1 in self.slots:
+            oper = specialize(oper, self.slots[0].value_types(), self.slots[1].value_types())
+        types = self.value_types()
+        if types != None and type(None) not in types: # can't fail, no need to catch anything
+            return lambda: oper(a(), b())
+        def run():
+            try:
+                return oper(a(), b())
+            except: pass
+        return run
+
+    def constant(self):
+        return fold_operator(self)
+
+    def value_types(self):
+        return operator_types(self)
+
+    def is_pure(self):
+        return operator_pure(self)
+
+    def vectorize(self, name):
+        return vectorize_operator(self, name)
+
+# operators are plain functions (not lambdas) so block trees can be pickled and sent to a worker process
+def op_add(a, b): return a + b
+def op_sub(a, b): return a - b
+# ints times text, sequences or arrays would repeat them, floats can't do that
+def op_mul(a, b):
+    if exact_ints and (type(a) in repeatable or type(b) in repeatable): raise TypeError("can't multiply")
+    return a * b
+def op_div(a, b): return a // b if exact_ints and type(a) is int and type(b) is int and a % b == 0 else a / b
+def op_mod(a, b): return a % b if exact_ints and type(a) is int and type(b) is int else float(int(a) % int(b))
+# exact mode compares ints with floats like floats with each other (isclose), ints with each other exactly
+def op_eq(a, b):
+    if isinstance(a, float): return close(a, b) if isinstance(b, float) or exact_ints and type(b) is int else a == b
+    return close(a, b) if exact_ints and type(a) is int and isinstance(b, float) else a == b
+def op_neq(a, b):
+    if isinstance(a, float): return (not close(a, b)) if isinstance(b, float) or exact_ints and type(b) is int else a != b
+    return (not close(a, b)) if exact_ints and type(a) is int and isinstance(b, float) else a != b
+# an int too big for a float isn't close to any float. isclose raises on those, which the compiled
+# comparisons don't catch (operator_types says they can't fail)
+def close(a, b):
+    try:
+        return math.isclose(a, b)
+    except OverflowError:
+        return False
+def op_gr(a, b): return a > b
+def op_ls(a, b): return a < b
+def op_and(a, b): return a and b
+def op_or(a, b): return a or b
+
+repeatable = {str, tuple, array.array} # see op_mul
+
+# versions of the operators that skip the type checks, for when the operand types are known
+def op_eq_float(a, b): return math.isclose(a, b)
+def op_neq_float(a, b): return not math.isclose(a, b)
+def op_eq_num(a, b): return a == b if a is None or b is None else math.isclose(a, b) # floats or None
+def op_neq_num(a, b): return a != b if a is None or b is None else not math.isclose(a, b)
+
+FLOAT = frozenset((float,))
+NUM = frozenset((float, type(None))) # result of a numeric operator that can fail
+EXACT_NUM = frozenset((int, float, type(None))) # the same in exact mode, where whole numbers stay ints
+def specialize(oper, a_types, b_types):
+    if oper in (op_eq, op_neq) and a_types != None and b_types != None:
+        if a_types <= FLOAT and b_types <= FLOAT:
+            return op_eq_float if oper == op_eq else op_neq_float
+        if a_types <= NUM and b_types <= NUM:
+            return op_eq_num if oper == op_eq else op_neq_num
+    return oper
+
+# result types of the operators given the operand types (None for unknown), see operator_types
+def add_types(a, b): return FLOAT if a == b == FLOAT else {str} if a == b == {str} else None
+def arith_types(a, b): return FLOAT if a == b == FLOAT else None
+def compare_types(a, b): return {bool} if a == b == FLOAT else None
+def known_types(a, b): return a != None and b != None
+op_types = {
+    op_add: add_types,
+    op_sub: arith_types,
+    op_mul: arith_types,
+    op_div: lambda a, b: NUM if a == b == FLOAT else None,
+    op_mod: lambda a, b: EXACT_NUM if exact_ints else NUM, # float() or an error whatever the operands are, ints too in exact mode
+    op_eq: lambda a, b: {bool} if known_types(a, b) else None,
+    op_neq: lambda a, b: {bool} if known_types(a, b) else None,
+    op_gr: compare_types,
+    op_ls: compare_types,
+    op_and: lambda a, b: a | b if known_types(a, b) else None,
+    op_or: lambda a, b: a | b if known_types(a, b) else None,
+}
+
+# every operator is a subclass with the label and function on the class, so blocks only store their slots
+def operator_class(base, name, label, oper):
+    return type(name, (base,), {"default_label": label, "oper": staticmethod(oper), "__slots__": (), "__module__": __name__})
+
+AddBlock = operator_class(BOpBlock, "AddBlock", "+", op_add)
+SubBlock = operator_class(BOpBlock, "SubBlock", "-", op_sub)
+MulBlock = operator_class(BOpBlock, "MulBlock", "x", op_mul)
+DivBlock = operator_class(BOpBlock, "DivBlock", "/", op_div)
+ModBlock = operator_class(BOpBlock, "ModBlock", "%", op_mod)
+EqBlock = operator_class(BOpBlock, "EqBlock", "=", op_eq)
+NEqBlock = operator_class(BOpBlock, "NEqBlock", "!=", op_neq)
+GrBlock = operator_class(BOpBlock, "GrBlock", ">", op_gr)
+LsBlock = operator_class(BOpBlock, "LsBlock", "<", op_ls)
+AndBlock = operator_class(BOpBlock, "AndBlock", "&&", op_and)
+OrBlock = operator_class(BOpBlock, "OrBlock", "||", op_or)
 
 # unary operators
 class UOpBlock(SlotBlock):
     default_valid_parent = False
-    def __init__(self, label, oper):
-        super().__init__(label, (155, 89, 182), 1, {}, [])
-        self.oper = oper
+    default_color = (155, 89, 182)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         try:
             return self.oper(self.slots[0].execute())
         except: pass
 
-NotBlock = lambda: UOpBlock("!", lambda a: not a)
-RndBlock = lambda: UOpBlock("round", lambda a: float(int(a + 0.5)))
-FlrBlock = lambda: UOpBlock("floor", lambda a: float(int(a)))
-CelBlock = lambda: UOpBlock("ceil", lambda a: float(int(a + 1)))
+    def steps(self):
+        yield
+        try:
+            return self.oper((yield from self.slots[0].steps()))
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        is_const, value = self.constant()
+        if is_const: return lambda: value # folded
+        oper, a = self.oper, self.compile_slot(0)
+        types = self.value_types()
+        if types != None and type(None) not in types:
+            return lambda: oper(a())
+        def run():
+            try:
+                return oper(a())
+            except: pass
+        return run
+
+    def constant(self):
+        return fold_operator(self)
+
+    def value_types(self):
+        return operator_types(self)
+
+    def is_pure(self):
+        return operator_pure(self)
+
+    def vectorize(self, name):
+        return vectorize_operator(self, name)
+
+def op_not(a): return not a
+# ints are already whole, so exact mode gives them back (ceil still adds one, like it does for whole floats)
+def op_rnd(a): return a if exact_ints and type(a) is int else float(int(a + 0.5))
+def op_flr(a): return a if exact_ints and type(a) is int else float(int(a))
+def op_cel(a): return a + 1 if exact_ints and type(a) is int else float(int(a + 1))
+
+def rounding_types(a): return EXACT_NUM if exact_ints else NUM
+op_types.update({
+    op_not: lambda a: {bool} if a != None else None,
+    op_rnd: rounding_types,
+    op_flr: rounding_types,
+    op_cel: rounding_types,
+})
+
+NotBlock = operator_class(UOpBlock, "NotBlock", "!", op_not)
+RndBlock = operator_class(UOpBlock, "RndBlock", "round", op_rnd)
+FlrBlock = operator_class(UOpBlock, "FlrBlock", "floor", op_flr)
+CelBlock = operator_class(UOpBlock, "CelBlock", "ceil", op_cel)
 
 # these operators also set the variable
 class IncBlock(SlotBlock):
     default_valid_parent = False
-    def __init__(self, slots = {}):
-        super().__init__("++", (142, 68, 173), 1, slots, [])
+    default_label = "++"
+    default_color = (142, 68, 173)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         try:
@@ -297,10 +1391,29 @@ class IncBlock(SlotBlock):
             return global_vars[self.slots[0].field]
         except: pass
 
+    def compile(self):
+        if not (0 in self.slots and isinstance(self.slots[0], FieldBlock)): return _noop
+        name = self.slots[0].field
+        def run():
+            try:
+                global_vars[name] += 1
+                return global_vars[name]
+            except: pass
+        return run
+
+    def assigns(self):
+        if 0 in self.slots and isinstance(self.slots[0], FieldBlock):
+            return self.slots[0].field
+
+    def reads(self):
+        return set() if self.assigns() == None else {self.assigns()} # whatever kind of field block names it
+
 class DecBlock(SlotBlock):
     default_valid_parent = False
-    def __init__(self, slots = {}):
-        super().__init__("--", (142, 68, 173), 1, slots, [])
+    default_label = "--"
+    default_color = (142, 68, 173)
+    slots_count = 1
+    __slots__ = ()
 
     def execute(self):
         try:
@@ -308,3 +1421,450 @@ class DecBlock(SlotBlock):
             return global_vars[self.slots[0].field]
         except: pass
 
+    def compile(self):
+        if not (0 in self.slots and isinstance(self.slots[0], FieldBlock)): return _noop
+        name = self.slots[0].field
+        def run():
+            try:
+                global_vars[name] -= 1
+                return global_vars[name]
+            except: pass
+        return run
+
+    def assigns(self):
+        if 0 in self.slots and isinstance(self.slots[0], FieldBlock):
+            return self.slots[0].field
+
+    def reads(self):
+        return set() if self.assigns() == None else {self.assigns()} # whatever kind of field block names it
+
+
+# SEQUENCES #
+# Range makes a sequence of numbers, Map and Filter go through one with an element variable and sum, count, min and
+# max reduce it to a number. sequences are read-only numpy arrays of floats, or tuples of floats without numpy.
+# compiled Map and Filter blocks evaluate their expression for all elements at once when every block in it has a
+# vectorized version (vectorize() method), otherwise they go one element at a time like execute() does. both have to
+# give the same results, so the vectorized operators raise on anything they can't reproduce exactly (errors in single
+# elements, bools in arithmetic, ...) and the block falls back to going one element at a time
+RANGE_LIMIT = 10 ** 7 # longer ranges evaluate to None, like any other operator error
+
+# numpy takes longer to import than everything else together, so it's only imported once sequences get used
+numpy_checked = False
+def load_numpy():
+    global numpy, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+    return numpy
+
+def is_sequence(value):
+    if isinstance(value, tuple): return True
+    if isinstance(value, (float, int, str, type(None), array.array)): return False # without importing numpy
+    return load_numpy() != None and isinstance(value, numpy.ndarray)
+
+# the reductions also take arrays (see ARRAYS), numpy reads them without copying
+def check_sequence(value):
+    if not is_sequence(value) and not is_array(value): raise TypeError("not a sequence")
+    return value
+
+# Map and Filter go through a copy of arrays, the expression could change the array while they go through it
+def each_items(value):
+    return make_sequence(value) if is_array(value) else check_sequence(value)
+
+def make_sequence(values):
+    if load_numpy() == None: return tuple(values)
+    items = numpy.array(values, dtype = float)
+    items.flags.writeable = False # ranges can get hoisted out of loops and handed out more than once
+    return items
+
+# elements as python floats, numpy's float64 doesn't raise on division by zero
+def sequence_items(items):
+    return items if isinstance(items, (tuple, array.array)) else items.tolist()
+
+# str() of an int with more digits than sys.get_int_max_str_digits() raises ValueError (exact mode makes those
+# easily), they get shown as their first digits and digit count instead
+def value_str(value):
+    try:
+        return str(value)
+    except ValueError:
+        if isinstance(value, int): return long_int_text(value)
+        return value_text(value) # a sequence holding one
+
+# the first digits come from the top 64 bits, the rest can't change them by more than rounding
+def long_int_text(value):
+    magnitude = abs(value)
+    shift = magnitude.bit_length() - 64
+    digits = math.log10(magnitude >> shift) + shift * math.log10(2)
+    exponent = math.floor(digits)
+    if abs(digits - round(digits)) < 1e-6: # right by a power of ten, the float can't tell which side it's on
+        exponent = round(digits) if magnitude >= 10 ** round(digits) else round(digits) - 1
+    mantissa = min(max(10 ** (digits - exponent), 1.0), 9.999999999)
+    return f"{'-' if value < 0 else ''}{mantissa:.9f}e+{exponent} ({exponent + 1} digits)"
+
+# short text for a value, sequences and arrays only show their first and last few elements
+def value_text(value, shown = 6):
+    if not is_sequence(value) and not is_array(value): return value_str(value)
+    if len(value) <= shown:
+        items = sequence_items(value)
+    else:
+        items = [*sequence_items(value[:shown // 2]), "...", *sequence_items(value[-(shown // 2):])]
+    kind = "array " if is_array(value) else ""
+    return f"{kind}[{', '.join(map(value_str, items))}] ({len(value)} items)"
+
+def op_range(start, stop, step):
+    if not all(isinstance(x, (int, float)) for x in (start, stop, step)): raise TypeError("not a number")
+    count = max(0, math.ceil((stop - start) / step))
+    if count > RANGE_LIMIT: raise OverflowError("range too long")
+    if load_numpy() == None:
+        return tuple(float(start + i * step) for i in range(count))
+    with numpy.errstate(all = "ignore"):
+        items = start + numpy.arange(count, dtype = float) * step
+    items.flags.writeable = False
+    return items
+
+class RangeBlock(SlotBlock):
+    default_valid_parent = False
+    default_label = "Range"
+    default_color = (22, 160, 133)
+    slots_count = 3
+    __slots__ = ()
+
+    # start, stop and an optional step, which defaults to 1
+    def execute(self):
+        try:
+            start, stop = self.slots[0].execute(), self.slots[1].execute()
+            return op_range(start, stop, self.slots[2].execute() if 2 in self.slots else 1.0)
+        except: pass
+
+    def steps(self):
+        yield
+        try:
+            start, stop = (yield from self.slots[0].steps()), (yield from self.slots[1].steps())
+            return op_range(start, stop, (yield from self.slots[2].steps()) if 2 in self.slots else 1.0)
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        start, stop = self.compile_slot(0), self.compile_slot(1)
+        step = self.compile_slot(2) if 2 in self.slots else lambda: 1.0
+        def run():
+            try:
+                return op_range(start(), stop(), step())
+            except: pass
+        return run
+
+    def is_pure(self):
+        return operator_pure(self)
+
+# base class of Map and Filter: element variable, sequence and the expression that gets evaluated for every element
+# the variable is left at the last element, like a for loop would leave it
+class EachBlock(SlotBlock):
+    default_valid_parent = False
+    default_color = (22, 160, 133)
+    slots_count = 3
+    __slots__ = ()
+
+    # missing slots or a slot 0 that isn't a Var make it evaluate to None without evaluating anything
+    def assigns(self):
+        if len(self.slots) == 3 and isinstance(self.slots[0], VarBlock):
+            return self.slots[0].field
+
+    def reads(self):
+        if self.assigns() == None: return set()
+        return self.slots[1].reads() | (self.slots[2].reads() - {self.assigns()})
+
+    def execute(self):
+        name = self.assigns()
+        if name == None: return None
+        try:
+            items = each_items(self.slots[1].execute())
+            results = []
+            for item in sequence_items(items):
+                global_vars[name] = item
+                results.append(self.slots[2].execute())
+            return self.combine(items, results)
+        except: pass
+
+    def steps(self):
+        yield
+        name = self.assigns()
+        if name == None: return None
+        try:
+            items = each_items((yield from self.slots[1].steps()))
+            results = []
+            for item in sequence_items(items):
+                global_vars[name] = item
+                results.append((yield from self.slots[2].steps()))
+            return self.combine(items, results)
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        name = self.assigns()
+        if name == None: return lambda: None
+        sequence, fn = self.slots[1].get_compiled(), self.slots[2].get_compiled()
+        vector = self.slots[2].vectorize(name) if load_numpy() != None else None
+        combine, combine_vector = self.combine, self.combine_vector
+        def run():
+            try:
+                items = each_items(sequence())
+                if vector != None and isinstance(items, numpy.ndarray) and len(items):
+                    try:
+                        with numpy.errstate(divide = "raise", over = "raise", invalid = "raise", under = "ignore"):
+                            result = combine_vector(items, vector(items))
+                        global_vars[name] = float(items[-1])
+                        return result
+                    except Exception: pass # something it can't do exactly, the slow way gets it right
+                results = []
+                for item in sequence_items(items):
+                    global_vars[name] = item
+                    results.append(fn())
+                return combine(items, results)
+            except: pass
+        return run
+
+class MapBlock(EachBlock):
+    default_label = "Map"
+    __slots__ = ()
+
+    def combine(self, items, results):
+        for value in results:
+            if is_sequence(value): raise TypeError("sequences can't be nested")
+        return make_sequence([float(value) for value in results])
+
+    def combine_vector(self, items, values):
+        result = numpy.array(numpy.broadcast_to(numpy.asarray(values, dtype = float), items.shape))
+        result.flags.writeable = False
+        return result
+
+class FilterBlock(EachBlock):
+    default_label = "Filter"
+    __slots__ = ()
+
+    def combine(self, items, results):
+        for value in results:
+            if is_sequence(value): raise TypeError("sequences can't be nested")
+        return make_sequence([item for item, keep in zip(sequence_items(items), results) if keep])
+
+    def combine_vector(self, items, values):
+        result = items[numpy.broadcast_to(vector_truth(values), items.shape)]
+        result.flags.writeable = False
+        return result
+
+def op_sum(a):
+    if load_numpy() == None: return float(sum(check_sequence(a)))
+    with numpy.errstate(all = "ignore"): # overflows to inf like the python sum would
+        return float(numpy.sum(check_sequence(a)))
+def op_count(a): return float(len(check_sequence(a)))
+def op_min(a): return float(min(check_sequence(a))) if load_numpy() == None else float(numpy.min(check_sequence(a)))
+def op_max(a): return float(max(check_sequence(a))) if load_numpy() == None else float(numpy.max(check_sequence(a)))
+
+op_types.update({
+    op_sum: lambda a: NUM,
+    op_count: lambda a: NUM,
+    op_min: lambda a: NUM,
+    op_max: lambda a: NUM,
+})
+
+SumBlock = operator_class(UOpBlock, "SumBlock", "sum", op_sum)
+CountBlock = operator_class(UOpBlock, "CountBlock", "count", op_count)
+MinBlock = operator_class(UOpBlock, "MinBlock", "min", op_min)
+MaxBlock = operator_class(UOpBlock, "MaxBlock", "max", op_max)
+
+# VECTORIZED OPERATORS #
+# numpy versions of the operators for arrays of elements, combined with each other or with float, bool and int scalars
+# each one has to give exactly what the scalar operator gives for every element, or raise
+def vector_scalar(value):
+    if not is_vector_scalar(value): raise TypeError("can't be vectorized")
+    return value
+
+# ints only show up in exact mode, numpy turns them into floats, which is only exact up to 2^53
+def is_vector_scalar(value):
+    return type(value) in (float, bool) or type(value) is int and exact_ints and abs(value) <= 2 ** 53
+
+def vector_kind(value):
+    if isinstance(value, numpy.ndarray):
+        return bool if value.dtype == bool else float
+    return float if type(value) is int else type(value)
+
+def vector_truth(value):
+    return value if vector_kind(value) is bool else value != 0
+
+def vector_floats(*values): # the integer operators go through int(), which fails on nan and inf
+    values = [numpy.asarray(value, dtype = float) for value in values]
+    if not all(numpy.isfinite(value).all() for value in values): raise ValueError("not finite")
+    return values
+
+def vector_arith(ufunc): # bool arithmetic gives ints, which compare differently
+    def run(a, b):
+        if vector_kind(a) is not float or vector_kind(b) is not float: raise TypeError("not floats")
+        return ufunc(a, b)
+    return run
+
+def vector_div(a, b): # python raises on every division by zero, ieee only on finite / 0
+    if (numpy.asarray(b) == 0).any(): raise ZeroDivisionError
+    return numpy.divide(a, b)
+
+def vector_mod(a, b):
+    a, b = (numpy.trunc(value) for value in vector_floats(a, b))
+    if (b == 0).any(): raise ZeroDivisionError
+    return numpy.mod(a, b) + 0.0 # no -0.0, the scalar version goes through int
+
+def vector_eq(a, b):
+    if vector_kind(a) is not float or vector_kind(b) is not float:
+        return a == b
+    with numpy.errstate(all = "ignore"): # same as math.isclose, the infinities get masked out
+        diff = numpy.abs(b - a)
+        close = (diff <= numpy.abs(1e-09 * b)) | (diff <= numpy.abs(1e-09 * a))
+    return (a == b) | close & numpy.isfinite(a) & numpy.isfinite(b)
+
+def vector_and(a, b): # the scalar versions give back an int operand as it is, here it would be a float
+    if vector_kind(a) is not vector_kind(b) or int in (type(a), type(b)): raise TypeError("mixed types")
+    return numpy.where(vector_truth(a), b, a)
+
+def vector_or(a, b):
+    if vector_kind(a) is not vector_kind(b) or int in (type(a), type(b)): raise TypeError("mixed types")
+    return numpy.where(vector_truth(a), a, b)
+
+vector_ops = {
+    op_add: vector_arith(lambda a, b: numpy.add(a, b)),
+    op_sub: vector_arith(lambda a, b: numpy.subtract(a, b)),
+    op_mul: vector_arith(lambda a, b: numpy.multiply(a, b)),
+    op_div: vector_arith(vector_div),
+    op_mod: vector_mod,
+    op_eq: vector_eq,
+    op_neq: lambda a, b: ~vector_eq(a, b),
+    op_gr: lambda a, b: numpy.greater(a, b),
+    op_ls: lambda a, b: numpy.less(a, b),
+    op_and: vector_and,
+    op_or: vector_or,
+    op_not: lambda a: ~vector_truth(a),
+    op_rnd: lambda a: numpy.trunc(vector_floats(a)[0] + 0.5) + 0.0,
+    op_flr: lambda a: numpy.trunc(vector_floats(a)[0]) + 0.0,
+    op_cel: lambda a: numpy.trunc(vector_floats(a)[0] + 1) + 0.0,
+}
+
+
+# ARRAYS #
+# arrays are numbers that can be changed in place: Array makes one of a given size, Get and Put read and change an
+# element and Append adds one at the end. they're stored as array("d") (8 bytes per number, no float objects) and
+# shared between variables like python lists are. the reductions work on them too, Count gives the length
+# Put and Append change arrays without assigning any variable, so loops containing them don't hoist anything
+# (writes() is None) and inferred memos leave functions that contain them alone. arrays can't be memo keys anyway
+ARRAY_LIMIT = 10 ** 7 # bigger arrays evaluate to None, this is already 80 MB
+
+def is_array(value):
+    return isinstance(value, array.array)
+
+def check_array(value):
+    if not is_array(value): raise TypeError("not an array")
+    return value
+
+# whole floats, or ints in exact mode. bools don't count
+def is_whole(value):
+    return type(value) is float and value.is_integer() or type(value) is int and exact_ints
+
+# indexes are whole numbers from 0, anything else raises
+def array_index(items, i):
+    if not is_whole(i) or not 0 <= i < len(items): raise IndexError("bad index")
+    return int(i)
+
+def op_array(size, fill):
+    if not is_whole(size) or not 0 <= size <= ARRAY_LIMIT: raise ValueError("bad size")
+    return array.array("d", [fill]) * int(size)
+
+# sequences can be read the same way
+def op_get(a, i):
+    if not is_array(a) and not is_sequence(a): raise TypeError("not an array")
+    return float(a[array_index(a, i)])
+
+# array("d") itself refuses anything that isn't a number
+def op_put(a, i, value): check_array(a)[array_index(a, i)] = value
+def op_append(a, value): check_array(a).append(value)
+
+op_types[op_get] = lambda a, b: NUM
+
+GetBlock = operator_class(BOpBlock, "GetBlock", "get", op_get)
+
+# size and an optional number every element starts at, which defaults to 0
+class ArrayBlock(SlotBlock):
+    default_valid_parent = False
+    default_label = "Array"
+    default_color = (41, 128, 185)
+    slots_count = 2
+    __slots__ = ()
+
+    def execute(self):
+        try:
+            size = self.slots[0].execute()
+            return op_array(size, self.slots[1].execute() if 1 in self.slots else 0.0)
+        except: pass
+
+    def steps(self):
+        yield
+        try:
+            size = yield from self.slots[0].steps()
+            return op_array(size, (yield from self.slots[1].steps()) if 1 in self.slots else 0.0)
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        size = self.compile_slot(0)
+        fill = self.compile_slot(1) if 1 in self.slots else lambda: 0.0
+        def run():
+            try:
+                return op_array(size(), fill())
+            except: pass
+        return run
+
+    # every evaluation makes a new array, so it's never pure (or folded, or hoisted)
+
+# base class of Put and Append, which call their operator with the values of all slots and catch every error
+class ArrayOpBlock(SlotBlock):
+    default_valid_parent = False
+    default_color = (41, 128, 185)
+    __slots__ = ()
+
+    def execute(self):
+        try:
+            self.oper(*[self.slots[i].execute() for i in range(self.slots_count)])
+        except: pass
+
+    def steps(self):
+        yield
+        try:
+            values = []
+            for i in range(self.slots_count):
+                values.append((yield from self.slots[i].steps()))
+            self.oper(*values)
+        except GeneratorExit: raise
+        except: pass
+
+    def compile(self):
+        oper = self.oper
+        parts = tuple(self.compile_slot(i) for i in range(self.slots_count))
+        def run():
+            try:
+                oper(*[part() for part in parts])
+            except: pass
+        return run
+
+    def writes(self):
+        return None # the array can be in any number of variables
+
+# array, index and the new value
+class PutBlock(ArrayOpBlock):
+    default_label = "Put"
+    oper = staticmethod(op_put)
+    slots_count = 3
+    __slots__ = ()
+
+# array and the value to add
+class AppendBlock(ArrayOpBlock):
+    default_label = "Append"
+    oper = staticmethod(op_append)
+    slots_count = 2
+    __slots__ = ()
@@ -0,0 +1,91 @@
+# cli.py runs a saved block program without opening a window, for regression and performance checks on servers
+# usage: python cli.py program.pyblocks [--level N] [--mode compiled|interpret|step] [--exact] [--processes N] [--profile REPORT]
+# only imports modules that don't touch pygame
+
+# LIBRARY IMPORTS #
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+# LOCAL MODULES #
+import blocks
+import profiler
+import runner
+import serialize
+import shared
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description = "Run a saved PyBlocks program headlessly.")
+    parser.add_argument("program", help = "program file saved from the game (F5), binary or .json")
+    parser.add_argument("--level", type = int, help = "level to check the 'goal' variable against, defaults to any level")
+    parser.add_argument("--mode", choices = ["compiled", "interpret", "step"], default = "compiled", help = "interpreter to run the program with")
+    parser.add_argument("--exact", action = "store_true", help = "exact integer mode, whole numbers are ints instead of floats")
+    parser.add_argument("--processes", type = int, help = "processes Parallel blocks use (compiled mode only), defaults to the number of cores")
+    parser.add_argument("--quiet", action = "store_true", help = "only print the verdict line")
+    parser.add_argument("--profile", metavar = "REPORT", help = "time every block (compiled mode only) and write the report here")
+    return parser.parse_args(argv)
+
+# runs the program, returns (global_vars, printed output, seconds, error)
+# with a report path, the run is profiled and the report gets written there
+def run_file(path, mode = "compiled", report = None):
+    global_blocks = serialize.load_file(path)
+    output = io.StringIO()
+    error = None
+
+    def execute():
+        nonlocal error
+        try:
+            runner.execute_program(global_blocks, mode)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        if report:
+            results = profiler.profile_program(global_blocks, execute)
+        else:
+            execute()
+    if report:
+        profiler.Report(profiler.program_blocks(global_blocks), results).write(report)
+    return blocks.global_vars, output.getvalue(), time.perf_counter() - start, error
+
+def main(argv = None):
+    args = parse_args(argv)
+    if args.profile and args.mode != "compiled":
+        print("--profile only works with --mode compiled")
+        return 2
+    blocks.exact_ints = args.exact
+    blocks.parallel_processes = args.processes
+    try:
+        global_vars, output, seconds, error = run_file(args.program, args.mode, args.profile)
+    except (OSError, ValueError) as e: # loading the file or writing the report, errors of the program end up in error
+        print(f"couldn't run {args.program}: {e}")
+        return 2
+
+    if args.level != None:
+        passed = not error and shared.check_level(args.level, global_vars)
+        verdict = f"level {args.level}: {'PASS' if passed else 'FAIL'}"
+    else:
+        levels = [] if error else shared.passed_levels(global_vars)
+        passed = bool(levels)
+        verdict = f"passes levels: {', '.join(map(str, levels))}" if levels else "passes no level"
+
+    print(f"{verdict} ({seconds:.3f}s, {args.mode}{', exact' if args.exact else ''})")
+    if not args.quiet:
+        if error: print(f"error: {error}")
+        print("variables:")
+        for label, val in global_vars.items():
+            print(f"  {label} = {blocks.value_text(val)}")
+        for name, fn in blocks.global_fns.items(): # compiled runs memoize functions, see blocks.Memo
+            if fn != None and fn.memo != None:
+                print(f"memo {name}: {fn.memo.stats()}")
+        lines = output.splitlines()
+        print(f"output ({len(lines)} lines):")
+        for line in lines:
+            print(f"  {line}")
+    return 0 if passed else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
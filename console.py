@@ -0,0 +1,98 @@
+# console.py collects what Print blocks output, since printing every line to stdout took longer than the loops
+# doing the printing (and the window never showed it). no pygame in here, the worker process buffers its output too
+# graphics.display_console shows the game's console, runner.py sends the worker's lines over in batches
+
+# LIBRARY IMPORTS #
+import collections
+import itertools
+import sys
+import threading
+
+CONSOLE_LINES = 1000 # lines kept, the oldest ones get dropped first
+
+# ring buffer of output lines, counts whatever fell out of it. write() can be called from the program thread
+# while another thread take()s, the lock keeps the lines and the counters in step
+# with a sink, a full buffer gets handed to it as a take() instead of dropping lines (the worker's console sends
+# them to the game's, see runner.worker_main)
+class Console:
+    def __init__(self, size = CONSOLE_LINES, mirror = None, sink = None):
+        self.lines = collections.deque(maxlen = size)
+        self.lock = threading.Lock()
+        self.dropped = 0 # lines that fell out before anyone saw them
+        self.taken_dropped = 0 # how many of those take() already reported
+        self.mirror = mirror # file every line gets copied to as well, see flush()
+        self.pending = [] # lines that still have to go to the mirror
+        self.sink = sink
+        self.scroll = 0 # lines the panel is scrolled up from the newest one
+
+    # one printed value, which can span several lines
+    def write(self, text):
+        with self.lock:
+            self.append(text.split("\n") if "\n" in text else (text,))
+
+    # lines from another console's take()
+    def extend(self, lines, dropped = 0):
+        with self.lock:
+            self.dropped += dropped
+            self.append(lines)
+
+    # only with the lock held
+    def append(self, lines):
+        for line in lines:
+            if len(self.lines) == self.lines.maxlen:
+                if self.sink != None:
+                    self.sink(self.take_locked())
+                else:
+                    self.dropped += 1
+            self.lines.append(line)
+            if self.scroll: # the panel stays on the lines it shows
+                self.scroll += 1
+            if self.mirror != None:
+                self.pending.append(line)
+
+    # removes and returns everything written so far, with how many lines got dropped since the last take()
+    def take(self):
+        with self.lock:
+            return self.take_locked()
+
+    # hands whatever is buffered to the sink, the same way a full buffer does
+    def send(self):
+        with self.lock:
+            if self.lines or self.dropped != self.taken_dropped:
+                self.sink(self.take_locked())
+
+    def take_locked(self):
+        lines = list(self.lines)
+        self.lines.clear()
+        dropped = self.dropped - self.taken_dropped
+        self.taken_dropped += dropped
+        return lines, dropped
+
+    # copies the pending lines to the mirror in one write, called once per frame
+    def flush(self):
+        if self.pending:
+            self.mirror.write("\n".join(self.pending) + "\n")
+            self.mirror.flush()
+            self.pending.clear()
+
+    def clear(self):
+        with self.lock:
+            self.lines.clear()
+            self.dropped = self.taken_dropped = 0
+            self.scroll = 0
+
+    # keeps at least count lines on screen
+    def scroll_by(self, n, count):
+        self.scroll = max(0, min(self.scroll + n, len(self.lines) - count))
+
+    # the count lines the panel shows, only those get copied out of the buffer
+    def visible(self, count):
+        scroll = min(self.scroll, max(0, len(self.lines) - count))
+        newest = itertools.islice(reversed(self.lines), scroll, scroll + count)
+        return list(newest)[::-1]
+
+# where the game mirrors program output: None, "stdout" or a file path (appended to)
+def open_mirror(target):
+    if target == None: return None
+    if target == "stdout": return sys.stdout
+    return open(target, "a")
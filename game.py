@@ -6,13 +6,23 @@ import copy
 
 # LOCAL MODULES #
 import blocks as block_defs # 'blocks' is too valuable of a variable name to use on a module
+import console
+import profiler
+import runner
+import serialize
 import shared
+import spatial
+
+SAVE_PATH = "program.pyblocks" # where F5/F9 save and load the program, cli.py runs these files. use .json for the readable form
+PROFILE_PATH = "profile.txt" # where F3 writes the profiler report
+OUTPUT_MIRROR = None # copy program output to "stdout" or a file path as well as the console panel, see console.open_mirror
 
 class Game:
     # constructor, initialize all variables
     def __init__(self):
         self.global_blocks = []
         self.level = 1
+        self.index = spatial.SpatialIndex() # filled in by graphics.update_layout
 
         self.ghost = None
         self.field_block = None
@@ -20,6 +30,18 @@ class Game:
         self.typing = False
         self.placing = False
 
+        self.save_path = SAVE_PATH
+        self.execution = None # currently running program, see runner.py
+        self.run_timeout = runner.RUN_TIMEOUT
+        self.step_mode = False # run in-process on the step interpreter instead of a worker process
+        self.profiling = False # time every block, runs always go to a worker when profiling
+        self.profiled_blocks = None # the program as it was when the profiled run started, see profiler.program_blocks
+        self.profile = None # profiler.Report of the last profiled run
+        self.watching = False # re-run the program after every edit, see edited()
+        self.watched_blocks = None # the program as it was when the watch mode run started, the caches are numbered by it
+        self.console = console.Console(mirror = console.open_mirror(OUTPUT_MIRROR)) # shown by graphics.display_console
+        block_defs.output = self.console # step interpreter runs write to it directly, worker runs send their lines over
+
     # increments level by n
     def inc_level(self, n):
         self.level = shared.clamp(self.level + n, 1, len(shared.LEVEL_DATA))
@@ -27,31 +49,54 @@ class Game:
     # clears all of the blocks ingame
     def clear(self):
         self.global_blocks = []
+        self.index.clear()
+
+    def save(self):
+        try:
+            serialize.save_file(self.save_path, self.global_blocks)
+        except OSError as e:
+            print(f"Couldn't save {self.save_path}: {e}")
+            return
+        print(f"Saved program to {self.save_path}")
 
-    # recursively identifies what block is at pos, children have priority
-    def identify_block(self, pos, blocks = None):
-        if blocks == None: blocks = self.global_blocks
-        for block in blocks:
-            children = block.children[:]
-            if isinstance(block, block_defs.SlotBlock):
-                children.extend(list(block.slots.values())[:])
-            ret = self.identify_block(pos, children)
-            if ret: return ret
-            if shared.check_collision(block.pos, block.size, pos): return block
+    def load(self):
+        self.cancel()
+        try:
+            self.global_blocks = serialize.load_file(self.save_path)
+        except (OSError, ValueError) as e:
+            print(f"Couldn't load {self.save_path}: {e}")
+            return
+        self.index.clear() # gets filled in again by the next layout pass
+
+    # identifies what block is at pos, children and slot items have priority over the blocks containing them
+    # and earlier root blocks over later ones. blocks that aren't part of the block forest get skipped
+    def identify_block(self, pos):
+        best, best_key = None, None
+        for block in self.index.query(pos):
+            root, depth = block, 0
+            while root.parent:
+                root = root.parent
+                depth += 1
+            rank = self.index.ranks.get(root)
+            if rank == None: continue # not part of the forest (anymore)
+            key = (rank, -depth)
+            if best_key == None or key < best_key:
+                best, best_key = block, key
+        return best
 
     # handle placement input
     def begin_place(self, block_type):
         if not self.placing:
             self.ghost = getattr(block_defs, block_type)()
-            self.ghost.opacity = 128
+            self.ghost.set_opacity(128)
             self.placing = True
 
     def begin_move(self, target, pos):
         if self.placing or target == None: return
 
         self.ghost = target
-        self.delete_block(pos)
-        self.ghost.opacity = 128
+        self.remove_block(target)
+        self.ghost.set_opacity(128)
         self.ghost.valid_parent = self.ghost.default_valid_parent # incase it's moving out of a slot
         self.placing = True
 
@@ -59,7 +104,8 @@ class Game:
         if not self.placing: return
 
         self.placing = False
-        self.ghost.opacity = 255
+        self.ghost.set_opacity(255)
+        ghost = self.ghost
         if target:
             if isinstance(target, block_defs.SlotBlock):
                 if not target.fill_slot(self.ghost, pos):
@@ -71,32 +117,32 @@ class Game:
         else:
             self.global_blocks.append(self.ghost)
             del self.ghost
+
+        # the layout pass only reindexes blocks that move, the ghost might already be where it ends up
+        if ghost.parent or ghost in self.global_blocks:
+            self.index.update_tree(ghost)
+        self.edited()
     
-    # slotblock search has a slight variation, so a different helper function
-    def delete_slotblock(self, pos, slots):
-        for i, slot in slots.items():
-            if isinstance(slot, block_defs.SlotBlock):
-                if self.delete_slotblock(pos, slot.slots):
-                    return True
-            if shared.check_collision(slot.pos, slot.size, pos):
-                slots[i].cleanup()
-                del slots[i]
-                return True
-        return False
+    # removes block from whatever contains it
+    def remove_block(self, block):
+        parent = block.parent
+        if parent == None:
+            self.global_blocks.remove(block)
+        elif block in parent.children:
+            parent.children.remove(block)
+        else:
+            del parent.slots[next(i for i, item in parent.slots.items() if item == block)]
+        block.cleanup()
+        block.detach()
+        self.index.remove_tree(block)
 
-    # deletes whatever block is at pos, searches recursively
-    def delete_block(self, pos, blocks = None):
-        if blocks == None: blocks = self.global_blocks
-        for i, block in enumerate(blocks):
-            if isinstance(block, block_defs.SlotBlock):
-                if self.delete_slotblock(pos, block.slots):
-                    return True
-            if self.delete_block(pos, block.children):
-                return True
-            if shared.check_collision(block.pos, block.size, pos):
-                blocks[i].cleanup()
-                del blocks[i]
-                return True
+    # deletes whatever block is at pos
+    def delete_block(self, pos):
+        target = self.identify_block(pos)
+        if target:
+            self.remove_block(target)
+            self.edited()
+            return True
         return False
 
     # handle interacting with fieldblocks, pygame didn't support text input so i had to implement my own
@@ -111,29 +157,146 @@ class Game:
         if event.key == pygame.K_RETURN:
             self.typing = False
             self.field_block.validate()
+            self.field_block.invalidate() # field changed, compiled code is outdated
+            self.field_block.mark_dirty()
             self.field_block = None
+            self.edited()
         elif event.key == pygame.K_BACKSPACE:
             self.field_block.field = self.field_block.field[:-1]
+            self.field_block.mark_dirty()
         else:
             self.field_block.field += event.unicode
+            self.field_block.mark_dirty()
+
+    # cycles the memoization setting of the function block at pos, see FuncBlock.memo_vars
+    def cycle_memo(self, pos):
+        target = self.identify_block(pos)
+        if isinstance(target, block_defs.FuncBlock):
+            target.cycle_cacheable()
 
     # clones target block and begins placing
     def clone(self, target):
         if target != None and not self.placing:
             self.ghost = copy.deepcopy(target)
-            self.ghost.opacity = 128
+            self.ghost.set_opacity(128)
             self.placing = True
 
-    # (re)starts the game, execute all start block_defs. at the end, check if the problem was completed
-    def run(self):
+    # (re)starts the game, execute all start block_defs in a worker process (or the step interpreter)
+    # the result gets checked in update()
+    def run(self, quiet = False):
+        self.cancel(quiet)
         block_defs.global_vars = {}
+        self.console.clear()
+        if self.profiling:
+            self.profiled_blocks = profiler.program_blocks(self.global_blocks)
+            self.execution = runner.WorkerRun(self.global_blocks, self.run_timeout, profile = True, output = self.console)
+        elif self.step_mode:
+            self.execution = runner.StepRun(self.global_blocks, self.run_timeout)
+        elif self.watching: # the worker starts from what the earlier watch mode runs cached, see live.py
+            self.watched_blocks = profiler.program_blocks(self.global_blocks)
+            caches = {i: block.live_cache for i, block in enumerate(self.watched_blocks) if block.live_cache != None}
+            self.execution = runner.WorkerRun(self.global_blocks, self.run_timeout, caches = caches, output = self.console)
+        else:
+            self.execution = runner.WorkerRun(self.global_blocks, self.run_timeout, output = self.console)
 
-        for root in self.global_blocks:
-            if isinstance(root, block_defs.StartBlock):
-                root.execute()
+    # called after every edit of the program. in watch mode the run starts over, the variable panel keeps
+    # showing the old values until the new run sends its own
+    def edited(self):
+        if not self.watching: return
+        shown = block_defs.global_vars
+        self.run(quiet = True)
+        if isinstance(self.execution, runner.WorkerRun):
+            self.execution.global_vars = shown
 
-        # check if the level was completed
-        if "goal" in block_defs.global_vars:
-            if block_defs.global_vars["goal"] == shared.LEVEL_DATA[self.level][1]: # check if 'goal' variable is correct
-                self.level = min(self.level + 1, len(shared.LEVEL_DATA)) # go to next level
+    def toggle_watch(self):
+        self.watching = not self.watching
+        print(f"Watch mode {'on' if self.watching else 'off'}")
+        if self.watching:
+            self.run()
+
+    # puts the caches of a finished watch mode run on the blocks they belong to, edits drop them again
+    def finish_watch(self):
+        for i, cache in (getattr(self.execution, "caches", None) or {}).items():
+            self.watched_blocks[i].live_cache = cache
 
+    def toggle_step_mode(self):
+        self.step_mode = not self.step_mode
+
+    # numbers compile differently in exact integer mode, so everything gets compiled again (and recomputed in watch mode)
+    def toggle_exact_ints(self):
+        block_defs.exact_ints = not block_defs.exact_ints
+        for block in profiler.program_blocks(self.global_blocks):
+            block.clear_compiled(block.parent)
+            block.live_cache = None
+        print(f"Exact integer mode {'on' if block_defs.exact_ints else 'off'}")
+
+    # the heatmap stays up until profiling gets turned off
+    def toggle_profiling(self):
+        self.profiling = not self.profiling
+        if not self.profiling:
+            self.show_profile(None)
+
+    # tints the blocks of the report (or none) and adds their counts, see graphics.compose
+    def show_profile(self, report):
+        if self.profile:
+            for block in self.profile.heatmap():
+                block.heat = None
+                block.mark_dirty()
+        self.profile = report
+        if report:
+            for block, heat in report.heatmap().items():
+                block.heat = heat
+                block.mark_dirty()
+
+    # picks up the profiler results of a run that ended, cancelled runs included
+    def finish_profile(self):
+        if getattr(self.execution, "profile", None) != None:
+            self.show_profile(profiler.Report(self.profiled_blocks, self.execution.profile))
+
+    def export_profile(self):
+        if not self.profile:
+            print("Nothing to export, run the program with profiling on (F2) first")
+            return
+        self.profile.write(PROFILE_PATH)
+        print(f"Saved profile to {PROFILE_PATH}")
+
+    # pausing and single stepping only exist for the step interpreter
+    def toggle_pause(self):
+        if isinstance(self.execution, runner.StepRun):
+            self.execution.toggle_pause()
+
+    def step(self):
+        if isinstance(self.execution, runner.StepRun) and self.execution.paused:
+            self.execution.step()
+
+    # status line shown while a program is running
+    def run_status(self):
+        if isinstance(self.execution, runner.StepRun):
+            state = "PAUSED" if self.execution.paused else "STEPPING"
+            return f"{state} {self.execution.ops} ops, {self.execution.ops_per_sec():,.0f} ops/s (ESC to cancel)"
+        state = "PROFILING" if self.profiling else "WATCHING" if self.watching else "RUNNING"
+        return f"{state} {self.execution.elapsed():.1f}s (ESC to cancel)"
+
+    def cancel(self, quiet = False):
+        if self.execution:
+            self.execution.cancel()
+            if not quiet: print(f"Run stopped: {self.execution.error}")
+            self.finish_profile()
+            self.execution = None
+
+    # called every frame, streams variables from the running program and checks the level once it finishes
+    def update(self):
+        if not self.execution: return
+
+        finished = self.execution.poll()
+        block_defs.global_vars = self.execution.global_vars
+        if self.console.mirror != None:
+            self.console.flush()
+        if finished:
+            self.finish_profile()
+            self.finish_watch()
+            if self.execution.error:
+                print(f"Run stopped: {self.execution.error}")
+            elif shared.check_level(self.level, block_defs.global_vars): # check if 'goal' variable is correct
+                self.level = min(self.level + 1, len(shared.LEVEL_DATA)) # go to next level
+            self.execution = None
@@ -0,0 +1,133 @@
+# grade.py checks a batch of saved programs against the levels, a few at a time in worker processes (see runner.py)
+# usage: python grade.py PROGRAM_OR_FOLDER... [--level N] [--jobs N] [--timeout S] [--memory MB] [--exact] [--out FILE]
+# every program gets checked like the game does when its run finishes, the results table goes to a csv file
+
+# LIBRARY IMPORTS #
+import argparse
+import csv
+import os
+import sys
+import time
+
+# LOCAL MODULES #
+import blocks
+import runner
+import serialize
+import shared
+
+RESULTS_PATH = "grades.csv"
+GRADE_TIMEOUT = 10.0 # seconds per program, the level solutions take less than that (besides level 7)
+# operators catch MemoryError like any other error, so a program that runs out of memory usually ends up timing out.
+# the limit is there so it can't take the machine down with it
+GRADE_MEMORY = 512 # MB per worker process
+POLL_INTERVAL = 0.005 # seconds between checks on the running programs
+EXTENSIONS = (".pyblocks", ".json") # what gets picked up from folders
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description = "Grade saved PyBlocks programs in parallel.")
+    parser.add_argument("programs", nargs = "+", help = "program files saved from the game, or folders of them")
+    parser.add_argument("--level", type = int, help = "level every program has to pass, defaults to any level")
+    parser.add_argument("--jobs", type = int, default = os.cpu_count() or 1,
+        help = "programs running at the same time, defaults to the number of cores. more than that makes them share cores, which counts against their timeout")
+    parser.add_argument("--timeout", type = float, default = GRADE_TIMEOUT, help = "seconds a program gets before it's stopped")
+    parser.add_argument("--memory", type = int, default = GRADE_MEMORY, help = "MB a program's worker process can use, 0 for no limit")
+    parser.add_argument("--exact", action = "store_true", help = "exact integer mode, see blocks.exact_ints")
+    parser.add_argument("--out", default = RESULTS_PATH, help = "where to write the results table")
+    return parser.parse_args(argv)
+
+# program files in the order they were given, folders in name order
+def find_programs(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(EXTENSIONS))
+        else:
+            found.append(path)
+    return found
+
+# starts a worker on the program, None if the file couldn't be loaded (the error goes into result)
+def start(path, result, args):
+    try:
+        global_blocks = serialize.load_file(path) # sets blocks.global_fns, which goes to the worker with the program
+    except (OSError, ValueError) as e:
+        result.update(verdict = "ERROR", error = f"couldn't load: {e}")
+        return None
+    memory = args.memory * 1024 * 1024 if args.memory else None
+    return runner.WorkerRun(global_blocks, args.timeout, memory_limit = memory, quiet = True)
+
+# the same check Game.update does once a run finishes, or cli.py without --level
+def finish(run, result, level):
+    result["seconds"] = run.elapsed()
+    if run.error:
+        result.update(verdict = "TIMEOUT" if run.timed_out else "ERROR", error = run.error)
+    elif level != None:
+        result["verdict"] = "PASS" if shared.check_level(level, run.global_vars) else "FAIL"
+    else:
+        levels = shared.passed_levels(run.global_vars)
+        result.update(verdict = "PASS" if levels else "FAIL", levels = " ".join(map(str, levels)))
+    if result["verdict"] == "FAIL":
+        result["goal"] = blocks.value_text(run.global_vars["goal"]) if "goal" in run.global_vars else "not set"
+
+# grades every program with at most jobs of them running at once, returns a result dict per program
+def grade(paths, args):
+    results = [{"program": path, "verdict": "", "levels": "", "goal": "", "seconds": 0.0, "error": ""} for path in paths]
+    pending = list(reversed(range(len(paths))))
+    running = {} # result index -> WorkerRun
+    while pending or running:
+        while pending and len(running) < args.jobs:
+            i = pending.pop()
+            run = start(paths[i], results[i], args)
+            if run != None:
+                running[i] = run
+        for i, run in list(running.items()):
+            if run.poll():
+                finish(run, results[i], args.level)
+                del running[i]
+        if running:
+            time.sleep(POLL_INTERVAL)
+    return results
+
+def write_results(path, results):
+    with open(path, "w", newline = "") as f:
+        writer = csv.DictWriter(f, fieldnames = list(results[0]))
+        writer.writeheader()
+        for result in results:
+            writer.writerow({**result, "seconds": f"{result['seconds']:.3f}"})
+
+def format_row(result, width):
+    row = f"{result['program']:<{width}} {result['verdict']:<8} {result['seconds']:>8.3f}s"
+    if result["levels"]: row += f"  levels {result['levels']}"
+    if result["goal"]: row += f"  goal = {result['goal']}"
+    if result["error"]: row += f"  {result['error']}"
+    return row
+
+def main(argv = None):
+    args = parse_args(argv)
+    if args.jobs < 1:
+        print("--jobs has to be at least 1")
+        return 2
+    if args.memory and runner.resource == None:
+        print("memory limits only work on unix, use --memory 0")
+        return 2
+    paths = find_programs(args.programs)
+    if not paths:
+        print("no programs found")
+        return 2
+    blocks.exact_ints = args.exact
+    blocks.parallel_processes = max(1, (os.cpu_count() or 1) // args.jobs) # the jobs already share the cores
+
+    start_time = time.perf_counter()
+    results = grade(paths, args)
+    seconds = time.perf_counter() - start_time
+
+    width = max(len(path) for path in paths)
+    for result in results:
+        print(format_row(result, width))
+    passed = sum(result["verdict"] == "PASS" for result in results)
+    print(f"{passed} of {len(results)} passed, {seconds:.2f}s with {args.jobs} jobs ({len(results) / seconds:.1f} programs/s)")
+    write_results(args.out, results)
+    print(f"results saved to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,18 +2,46 @@
 # isolating my game's interaction with pygame into one module helped development a lot
 
 # LIBRARY IMPORTS #
+import bisect
+import collections
+import os
 import pygame
 
 # LOCAL MODULES #
 import blocks
 import shared
 
+# main display surface and the font used throughout the game, importing doesn't open anything until init()
+display = None
+font = None
+FONT_SIZE = 25
+FONT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "font_cache.txt")
+
 # create main display surface, set title
-display = pygame.display.set_mode((1280, 720))
-pygame.display.set_caption("PyBlocks")
-# initialize font used throughout the game
-pygame.font.init()
-font = pygame.font.SysFont(pygame.font.get_default_font(), 25)
+def init(size = (1280, 720)):
+    global display, font
+    display = pygame.display.set_mode(size)
+    pygame.display.set_caption("PyBlocks")
+    pygame.font.init()
+    font = pygame.font.Font(font_path(pygame.font.get_default_font()), FONT_SIZE)
+
+# what pygame.font.SysFont would load. looking it up goes through every installed font, which takes a while on
+# some systems, so the result is kept in FONT_CACHE_PATH for the next start. None is pygame's own font
+def font_path(name):
+    try:
+        with open(FONT_CACHE_PATH) as f:
+            cached_name, path = f.read().split("\n")[:2]
+        if cached_name == name and (not path or os.path.exists(path)):
+            return path or None
+    except (OSError, ValueError):
+        pass
+    path = pygame.font.match_font(name)
+    try:
+        with open(FONT_CACHE_PATH, "w") as f:
+            f.write(f"{name}\n{path or ''}\n")
+    except OSError:
+        pass # read-only install, it just gets looked up every time
+    return path
 
 # adjustable variables for UI
 INDENT = 20
@@ -21,17 +49,53 @@ BORDER = 2
 PADDING = 5
 BGCOLOR = (236, 240, 241)
 
+# TEXT CACHE #
+# font.render is the most expensive call per frame, and almost all text is the same every frame
+# so rendered surfaces get kept in a bounded LRU cache keyed by (text, color). never draw onto a returned surface
+TEXT_CACHE_SIZE = 4096
+text_cache = collections.OrderedDict() # (text, color) -> (surface, size)
+text_cache_stats = {"hits": 0, "misses": 0}
+
+def cached_text(text, color):
+    key = (text, color)
+    entry = text_cache.get(key)
+    if entry:
+        text_cache.move_to_end(key)
+        text_cache_stats["hits"] += 1
+        return entry
+    text_cache_stats["misses"] += 1
+    surf = font.render(text, True, color)
+    entry = text_cache[key] = (surf, surf.get_size())
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last = False) # evict least recently used
+    return entry
+
+def render_text(text, color = (255, 255, 255)):
+    return cached_text(text, color)[0]
+
+def text_size(text, color = (255, 255, 255)):
+    return cached_text(text, color)[1]
+
+# hit/miss counts and how full the cache is
+def text_cache_info():
+    return dict(text_cache_stats, size = len(text_cache), max_size = TEXT_CACHE_SIZE)
+
 # DIALOG CODE #
+# dialogs only ever show the same lines, so they get rendered once and reused
+dialog_cache = {}
+
 # create_dialog for reusability
 def create_dialog(lines, size = (600, 600)):
-    surface = pygame.Surface(size)
-    surface.fill(BGCOLOR)
     ww, wh = pygame.display.get_surface().get_size()
     pos = (ww // 2 - size[0] // 2, wh // 2 - size[1] // 2)
-    for i, elem in enumerate(lines):
-        text = font.render(elem, True, (0, 0, 0))
-        surface.blit(text, (PADDING, PADDING + i * 25))
-    display.blit(surface, pos)
+    key = (tuple(lines), size)
+    if key not in dialog_cache:
+        surface = pygame.Surface(size)
+        surface.fill(BGCOLOR)
+        for i, elem in enumerate(lines):
+            surface.blit(render_text(elem, (0, 0, 0)), (PADDING, PADDING + i * 25))
+        dialog_cache[key] = surface
+    draw(dialog_cache[key], pos)
 
 # i prefer using lambda when the function would only be 1 line
 display_problem = lambda problem_text: create_dialog(shared.wrap_text(problem_text), (600, 100))
@@ -46,7 +110,7 @@ tutorial_text = """
     Only 'Start', 'If', 'While', and 'Function' blocks can have children.
     [BREAK] [BREAK]
     There are blocks for values, like 'Num' or 'Text' where you provide input, or blocks like 'True' and 'False'.
-    Some blocks have slots, like operators. The 'Add' block has 2 slots for example. 'Print' block prints to the console window.
+    Some blocks have slots, like operators. The 'Add' block has 2 slots for example. 'Print' block prints to the output console at the bottom (O toggles it).
     [BREAK] [BREAK]
     To define and assign variables, use the 'Set' block.
     It has 2 slots, the first slot is for a 'Var' block (the variable you want to set) and the second slot is for any value to set the variable to.
@@ -62,6 +126,7 @@ display_tutorial = lambda: create_dialog(shared.wrap_text(tutorial_text), (600,
 
 controls_elems = [
     "LMB: Move/Place/Interact", "RMB: Delete",
+    "MMB: Function Memoization (Auto/On/Off)",
     "LSHIFT + LMB: Clone",
     "X: Clear",
     "V: Toggle Variable Display",
@@ -69,170 +134,410 @@ controls_elems = [
     "T: Show Tutorial",
     "SPACE: Insert Menu",
     "ENTER: Run Code/Stop Typing",
+    "ESC: Cancel Run",
+    "M: Toggle Step Interpreter",
+    "P: Pause/Resume (Step Interpreter)",
+    "S: Single Step (While Paused)",
+    "I: Toggle Exact Integers",
+    "W: Toggle Watch Mode (Re-run After Every Edit)",
+    "O: Toggle Output Console, PAGE UP/DOWN: Scroll It",
+    "WHEEL/UP/DOWN: Pan, SHIFT + WHEEL: Pan Sideways",
+    "CTRL + WHEEL or +/-: Zoom, HOME: Reset View",
     "TAB: View Problem",
+    "F5: Save Program, F9: Load Program",
+    "F2: Toggle Profiler, F3: Export Profile",
     "LEFT ARROW: Previous Level",
     "RIGHT ARROW: Next Level",
 ]
 display_controls = lambda: create_dialog(controls_elems)
 
 def display_level(level):
-    text = font.render(f"LEVEL: {level}", True, (255, 255, 255))
+    text = render_text(f"LEVEL: {level}")
     ww = pygame.display.get_surface().get_size()[0]
-    display.blit(text, (ww // 2 - text.get_rect().width // 2, PADDING))
+    draw(text, (ww // 2 - text.get_rect().width // 2, PADDING))
+
+# shown under the level while a program is running
+def display_status(status):
+    text = render_text(status)
+    ww = pygame.display.get_surface().get_size()[0]
+    draw(text, (ww // 2 - text.get_rect().width // 2, PADDING + 25))
 
 def display_vars(global_vars):
     count = 0
     for label, val in global_vars.items():
-        surf = font.render(f"{label}: {str(val)}", True, (255, 255, 255))
-        display.blit(surf, (0, count * 25))
+        surf = render_text(f"{label}: {blocks.value_text(val)}") # sequences get cut short
+        draw(surf, (0, count * 25))
         count += 1
 
+# output panel along the bottom of the window, only the lines scrolled into view get rendered
+CONSOLE_ROWS = 6
+CONSOLE_CHARS = 200 # longer lines get cut off, the mirror still gets all of them
+CONSOLE_COLOR = (44, 62, 80)
+console_cache = {} # (width, height) -> background surface
+def display_console(console):
+    ww, wh = pygame.display.get_surface().get_size()
+    size = (ww, (CONSOLE_ROWS + 1) * 25 + PADDING * 2)
+    top = wh - size[1]
+    if size not in console_cache:
+        console_cache[size] = pygame.Surface(size)
+        console_cache[size].fill(CONSOLE_COLOR)
+    draw(console_cache[size], (0, top))
+
+    header = f"OUTPUT: {len(console.lines)} lines"
+    if console.dropped: header += f", {console.dropped} dropped"
+    if console.scroll: header += f" (scrolled up {console.scroll})"
+    draw(render_text(header, (149, 165, 166)), (PADDING, top + PADDING))
+    for i, line in enumerate(console.visible(CONSOLE_ROWS), 1):
+        if line:
+            draw(render_text(line[:CONSOLE_CHARS]), (PADDING, top + PADDING + i * 25))
+
 # returns list of pos and sizes for btns so main module can handle click detection
-# takes in list of tuples for button data
+# takes in list of tuples for button data. the buttons never change, so the menu is only built once
+insert_menu_cache = {}
 def display_insert_menu(btn_datas):
-    surface = pygame.Surface((600, 200))
-    surface.fill(BGCOLOR)
-
-    ps = []
-
-    # center in window
     ww, wh = pygame.display.get_surface().get_size()
-    spos = (ww // 2 - 300, wh // 2 - 100)
-
+    key = (tuple(btn_datas), (ww, wh))
+    if key in insert_menu_cache:
+        surface, spos, ps = insert_menu_cache[key]
+        draw(surface, spos)
+        return ps
+
+    # wrapping container functionality, lay the buttons out first so the menu is as tall as they need
+    btn_surfs = []
     cur_width = PADDING
     cur_height = PADDING
     for btn_data in btn_datas:
-        btn_text = font.render(btn_data[0], True, (255, 255, 255))
+        btn_text = render_text(btn_data[0])
         text_rect = btn_text.get_rect()
         btn_surf = pygame.Surface((text_rect.width + PADDING * 2, 40))
 
-        # wrapping container functionality
         if cur_width + text_rect.width + PADDING * 2 > 600:
             cur_width = PADDING
             cur_height += 40 + PADDING
 
         btn_surf.fill(btn_data[1])
         btn_surf.blit(btn_text, (PADDING, 10))
-        pos = (cur_width, cur_height)
+        btn_surfs.append((btn_surf, (cur_width, cur_height)))
+        cur_width += btn_surf.get_width() + PADDING
+
+    # center in window
+    height = max(200, cur_height + 40 + PADDING)
+    spos = (ww // 2 - 300, wh // 2 - height // 2)
+    surface = pygame.Surface((600, height))
+    surface.fill(BGCOLOR)
+
+    ps = []
+    for btn_surf, pos in btn_surfs:
         surface.blit(btn_surf, pos)
         btn_rect = btn_surf.get_rect()
-
-        cur_width += btn_rect.width + PADDING
         ps.append(((pos[0] + spos[0], pos[1] + spos[1]), (btn_rect.width, btn_rect.height)))
 
-    display.blit(surface, spos)
+    insert_menu_cache[key] = (surface, spos, ps)
+    draw(surface, spos)
 
     return ps
 
+# DIRTY RECTANGLES #
+# everything drawn on the display goes through draw(), which only records it for this frame. finish() compares
+# the frame with the last one, repaints just the rectangles that changed and only updates those on screen
+# surfaces passed to draw() must not be changed afterwards, changes are detected by surface identity
+FULL_REDRAW_RATIO = 0.5 # repaint the whole screen once this much of it is dirty
+frame = [] # (surface, pos, rect) in drawing order
+last_frame = [] # also keeps the last frame's surfaces alive, so their ids can't get reused
+full_redraw = True # first frame, or the window got exposed
+
+def draw(surface, pos):
+    frame.append((surface, pos, pygame.Rect(pos, surface.get_size())))
+
+def redraw_all():
+    global full_redraw
+    full_redraw = True
+
+# merges overlapping rectangles so regions don't get repainted twice
+def merge_rects(rects):
+    merged = []
+    for rect in rects:
+        i = rect.collidelist(merged)
+        while i != -1:
+            rect = rect.union(merged.pop(i))
+            i = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+def dirty_rects():
+    screen = display.get_rect()
+    new = {(id(surface), pos) for surface, pos, _ in frame}
+    old = {(id(surface), pos) for surface, pos, _ in last_frame}
+    rects = [rect for surface, pos, rect in frame if (id(surface), pos) not in old]
+    rects += [rect for surface, pos, rect in last_frame if (id(surface), pos) not in new]
+    return merge_rects([rect.clip(screen) for rect in rects if rect.colliderect(screen)])
+
 def prepare():
-    display.fill((0, 0, 0)) # black background
+    frame.clear()
 
 def finish():
-    pygame.display.update() # update display
+    global frame, last_frame, full_redraw
+    screen = display.get_rect()
+    rects = [] if full_redraw else dirty_rects()
+
+    if full_redraw or sum(rect.w * rect.h for rect in rects) > screen.w * screen.h * FULL_REDRAW_RATIO:
+        display.fill((0, 0, 0)) # black background
+        display.blits([(surface, pos) for surface, pos, _ in frame], False)
+        pygame.display.update() # update display
+    elif rects:
+        for rect in rects:
+            display.set_clip(rect)
+            display.fill((0, 0, 0))
+            display.blits([(surface, pos) for surface, pos, srect in frame if rect.colliderect(srect)], False)
+        display.set_clip(None)
+        pygame.display.update(rects)
+
+    full_redraw = False
+    last_frame, frame = frame, last_frame
+
+# CAMERA #
+# block positions are world coordinates, the camera maps them onto the window. Game and the spatial index only ever
+# see world coordinates, main.py converts mouse positions with to_world(). dialogs and panels don't move with it
+ZOOM_LEVELS = (0.25, 0.5, 0.75, 1.0, 1.5, 2.0)
+SIMPLE_ZOOM = 0.5 # at or below this, blocks are drawn as plain boxes, the text would be too small to read anyway
+PAN_STEP = 60 # window pixels per mouse wheel notch or arrow key press
+camera_pos = (0, 0) # world position at the top left corner of the window
+zoom = 1.0
+
+def to_world(pos):
+    return (int(pos[0] / zoom + camera_pos[0]), int(pos[1] / zoom + camera_pos[1]))
+
+def to_screen(pos):
+    return (round((pos[0] - camera_pos[0]) * zoom), round((pos[1] - camera_pos[1]) * zoom))
+
+# the part of the world that's in the window
+def viewport():
+    ww, wh = pygame.display.get_surface().get_size()
+    return pygame.Rect(camera_pos, (int(ww / zoom) + 1, int(wh / zoom) + 1))
+
+# moves the camera by (dx, dy) window pixels
+def pan(dx, dy):
+    global camera_pos
+    camera_pos = (camera_pos[0] + int(dx / zoom), camera_pos[1] + int(dy / zoom))
+
+# steps through ZOOM_LEVELS, keeping whatever is at pos (window coordinates, the middle by default) where it is
+def zoom_at(steps, pos = None):
+    global camera_pos, zoom
+    if pos == None:
+        ww, wh = pygame.display.get_surface().get_size()
+        pos = (ww // 2, wh // 2)
+    i = shared.clamp(ZOOM_LEVELS.index(zoom) + steps, 0, len(ZOOM_LEVELS) - 1)
+    anchor = to_world(pos)
+    zoom = ZOOM_LEVELS[i]
+    camera_pos = (int(anchor[0] - pos[0] / zoom), int(anchor[1] - pos[1] / zoom))
+
+def reset_camera():
+    global camera_pos, zoom
+    camera_pos = (0, 0)
+    zoom = 1.0
+
+# LAYOUT #
+# sizes and offsets are cached on the blocks and only recomputed for blocks marked layout_dirty (see
+# BaseBlock.mark_dirty), which are always the changed blocks and their ancestors. layout() works out sizes bottom
+# up, place() turns the relative offsets into positions top down, render() just draws the results
+
+# label drawn on the block, with the execution count from the profiler while the heatmap is shown
+# and the memoization setting of functions that don't infer it
+def label_text(block):
+    label = block.label
+    if isinstance(block, blocks.FuncBlock) and block.cacheable != None:
+        label += " (memo)" if block.cacheable else " (no memo)"
+    return label if block.heat == None else f"{label} x{block.heat[1]}"
+
+# recomputes the size and relative offsets of every dirty block in the subtree, returns true if anything changed
+def layout(block):
+    if not block.layout_dirty: return False
+    # a block's width depends on its slot items, so they go first
+    if isinstance(block, blocks.SlotBlock):
+        for item in block.slots.values():
+            layout(item)
+    for child in block.children:
+        layout(child)
+
+    bh = block.size[1]
+    text_width = text_size(label_text(block))[0]
+
+    # calculate width
+    width = text_width + 10
+    if isinstance(block, blocks.SlotBlock): # account for slots
+        width += block.slots_count * bh + 8 * (block.slots_count - 1)
+        for item in block.slots.values():
+            width -= bh
+            width += item.size[0]
+    elif isinstance(block, blocks.FieldBlock):
+        width += text_size(block.field, (0, 0, 0))[0] + 10
+    bw = width
+
+    text_x = BORDER + PADDING
+    slot_offsets = {} # slot index -> where its empty square goes
+    field_offset = None
+    field_size = None
+
+    # handle SlotBlocks
+    if isinstance(block, blocks.SlotBlock):
+        # handle binary operator blocks separately for readability
+        if isinstance(block, blocks.BOpBlock):
+            if 0 in block.slots: # if the first slot is filled
+                slot_offsets[0] = (0, 0)
+                text_x = block.slots[0].size[0] + PADDING + BORDER * 2 + 1
+            else:
+                slot_offsets[0] = (BORDER, BORDER) # account for border
+                text_x = bh + PADDING * 2 + 1
 
-# to be called once per frame
-def render(tasks):
+            if 1 in block.slots: # if the second slot is filled
+                slot_offsets[1] = (bw - block.slots[1].size[0], 0)
+            else:
+                slot_offsets[1] = (bw - bh + BORDER, BORDER)
+        else:
+            # arbitrary # of slots, similar to code above
+            cur_width = text_width + PADDING * 2
+            for i in range(block.slots_count):
+                slot_pos = (cur_width + i * 8 + BORDER, BORDER)
+                if i in block.slots:
+                    slot_pos = (slot_pos[0] - BORDER, slot_pos[1] - BORDER)
+                    cur_width += block.slots[i].size[0] + BORDER
+                else:
+                    cur_width += bh
+                slot_offsets[i] = slot_pos
+    elif isinstance(block, blocks.FieldBlock): # handle FieldBlocks
+        field_offset = (text_width + PADDING * 2 + BORDER, BORDER)
+        field_size = (text_size(block.field, (0, 0, 0))[0] + PADDING * 2, bh)
+
+    # handle children
+    child_offsets = []
+    cur_height = bh + BORDER * 2
+    for child in block.children:
+        child_offsets.append((INDENT, cur_height))
+        cur_height += child.abs_height()
+    # the subtree is cur_height tall, this is how wide. render() skips subtrees that are out of view
+    extent = max([bw + BORDER * 2] + [INDENT + child.layout[5] for child in block.children])
+
+    info = (text_x, slot_offsets, field_offset, field_size, child_offsets, extent)
+    if (bw, bh) != block.size or not block.layout or info[:4] != block.layout[:4]:
+        block.dirty = True # looks different, surface needs recomposing
+    block.size = (bw, bh)
+    block.layout = info
+    block.height = cur_height
+    block.layout_dirty = False
+    block.moved = True
+    return True
+
+# positions the subtree at pos, skipping everything that didn't move. if a spatial index is passed, every
+# block that moved gets reindexed. returns true if anything moved
+def place(block, pos, index = None):
+    if block.placed_pos == pos and not block.moved: return False
+    block.pos = block.placed_pos = pos
+    block.moved = False
+    bx, by = pos
+    text_x, slot_offsets, field_offset, field_size, child_offsets, _ = block.layout
+
+    if slot_offsets and block.slots_pos == None:
+        block.slots_pos = {}
+    for i, offset in slot_offsets.items():
+        block.slots_pos[i] = (bx + offset[0], by + offset[1])
+        if i in block.slots:
+            place(block.slots[i], block.slots_pos[i], index)
+    if field_offset:
+        block.field_ps = ((bx + field_offset[0], by + field_offset[1]), field_size)
+    for child, offset in zip(block.children, child_offsets):
+        place(child, (bx + offset[0], by + offset[1]), index)
+
+    if index != None: index.update(block)
+    return True
+
+# the layout pass, to be called once per frame before render(). roots keep their current pos
+def update_layout(roots, index = None):
+    if index != None: index.rank_roots(roots)
+    for root in roots:
+        changed = layout(root)
+        if place(root, root.pos, index) or changed:
+            root.commands = None # something in the tree changed, draw commands need rebuilding
+
+# profiled blocks get tinted towards this, the hottest block the most
+HEAT_COLOR = (255, 40, 40)
+def heat_color(block):
+    if block.heat == None: return block.color
+    t = 0.15 + 0.85 * block.heat[0] # every block that ran is a bit tinted
+    return tuple(int(c + (h - c) * t) for c, h in zip(block.color, HEAT_COLOR))
+
+# draws the body of a block (background, slots, field and label) onto a new surface
+def compose(block):
+    bw, bh = block.size
+    text_x, slot_offsets, field_offset, field_size, *_ = block.layout
+    surf = pygame.Surface((bw + BORDER * 2, bh + BORDER * 2))
+    surf.fill((52, 73, 94))
+    surf.fill(heat_color(block), ((BORDER, BORDER), block.size))
+
+    for offset in slot_offsets.values():
+        surf.fill(BGCOLOR, (offset, (bh, bh)))
+
+    if field_offset:
+        field_text_surf = render_text(block.field, (0, 0, 0))
+        surf.fill(BGCOLOR, (field_offset, field_size))
+        surf.blit(field_text_surf, (field_offset[0] + PADDING, field_offset[1] + bh // 2 - field_text_surf.get_rect().height // 2))
+
+    text_surf = render_text(label_text(block))
+    surf.blit(text_surf, (text_x, bh // 2 - text_surf.get_rect().height // 2 + BORDER))
+    surf.set_alpha(block.opacity)
+    return surf
+
+# the block's surface at the current zoom. surfaces only get redrawn if something about the block changed,
+# zoomed ones get scaled from it once per zoom level. zoomed far out, blocks are plain boxes without text
+def block_surface(block):
+    if block.dirty:
+        block.surface = block.scaled = None
+        block.dirty = False
+    if zoom != 1.0 and block.scaled != None and block.scaled[0] == zoom:
+        return block.scaled[1]
+    if zoom <= SIMPLE_ZOOM:
+        surf = pygame.Surface((round((block.size[0] + BORDER * 2) * zoom), round((block.size[1] + BORDER * 2) * zoom)))
+        surf.fill(heat_color(block))
+    else:
+        if not block.surface:
+            block.surface = compose(block)
+        if zoom == 1.0: return block.surface
+        w, h = block.surface.get_size()
+        surf = pygame.transform.smoothscale(block.surface, (round(w * zoom), round(h * zoom)))
+    surf.set_alpha(block.opacity)
+    block.scaled = (zoom, surf)
+    return surf
+
+# draw commands for the part of a tree inside view (a world rect), in the same order the blocks always got drawn in
+# children are stacked top to bottom, so the ones in view are found by bisecting their offsets. whatever is out of
+# view doesn't get looked at, so the cost depends on how much of the program is on screen
+def tree_commands(root, view):
+    commands = []
+    tasks = [root]
     while tasks: # while tasks queue is not empty
         block = tasks.pop()
         bx, by = block.pos
-        bw, bh = block.size
-
-        # render text onto a surface
-        text_surf = font.render(block.label, True, (255, 255, 255))
-
-        # calculate width
-        width = text_surf.get_rect().width + 10
-        if isinstance(block, blocks.SlotBlock): # account for slots
-            width += block.slots_count * bh + 8 * (block.slots_count - 1)
-            for item in block.slots.values():
-                width -= bh
-                width += item.size[0]
-        elif isinstance(block, blocks.FieldBlock):
-            text_temp = font.render(block.field, True, (0, 0, 0))
-            width += text_temp.get_rect().width + 10
-        block.size = (width, block.size[1])
-
-        # create main surface
-        block_surf = pygame.Surface((bw + BORDER * 2, bh + BORDER * 2))
-        block_surf.fill((52, 73, 94))
-        color_surf = pygame.Surface(block.size)
-        color_surf.fill(block.color)
-        block_surf.blit(color_surf, (BORDER, BORDER))
-        block_surf.set_alpha(block.opacity)
-
-        text_x = BORDER + PADDING
-
-        # handle SlotBlocks
-        def_slot_size = (block.size[1],) * 2
-        if isinstance(block, blocks.SlotBlock):
-            # handle binary operator blocks separately for readability
-            if isinstance(block, blocks.BOpBlock):
-                slot_a = pygame.Surface(def_slot_size) # create surfaces for slots
-                slot_b = pygame.Surface(def_slot_size)
-                slot_a.fill(BGCOLOR)
-                slot_b.fill(BGCOLOR)
-
-                offset_a = BORDER # account for border
-                if 0 in block.slots: # if the first slot is filled
-                    offset_a = 0
-                    text_x = block.slots[0].size[0] + PADDING + BORDER * 2 + 1
-                    block.slots[0].pos = (bx + offset_a, by + offset_a)
-                    tasks.append(block.slots[0]) # add slot item to render queue
-                else:
-                    text_x = bh + PADDING * 2 + 1
-
-                block.slots_pos[0] = (bx + offset_a, by + offset_a)
-                block_surf.blit(slot_a, (offset_a,) * 2)
-
-                offset_b = (bw - bh + BORDER, BORDER)
-                if 1 in block.slots: # if the second slot is filled
-                    offset_b = (bw - block.slots[1].size[0], 0) # set position
-                    block.slots[1].pos = (bx + offset_b[0], by + offset_b[1])
-                    tasks.append(block.slots[1]) # add to queue
-
-                block.slots_pos[1] = (bx + offset_b[0], by + offset_b[1])
-                block_surf.blit(slot_b, offset_b)
-            else:
-                # use a for loop to generate the arbitrary # of slots, similar to code above
-                cur_width = text_surf.get_rect().width + PADDING * 2
-                for i in range(block.slots_count):
-                    slot_surf = pygame.Surface(def_slot_size)
-                    slot_surf.fill(BGCOLOR)
-
-                    slot_pos = (cur_width + i * 8 + BORDER, BORDER)
-                    if i in block.slots:
-                        slot_pos = (slot_pos[0] - BORDER, slot_pos[1] - BORDER)
-
-                    block_surf.blit(slot_surf, slot_pos)
-                    block.slots_pos[i] = (block.pos[0] + slot_pos[0], block.pos[1] + slot_pos[1])
-
-                    if i in block.slots:
-                        block.slots[i].pos = block.slots_pos[i]
-                        tasks.append(block.slots[i])
-                        cur_width += block.slots[i].size[0] + BORDER
-                    else:
-                        cur_width += bh
-        elif isinstance(block, blocks.FieldBlock): # handle FieldBlocks
-            field_text_surf = font.render(block.field, True, (0, 0, 0))
-            field_size = (field_text_surf.get_rect().width + PADDING * 2, block.size[1])
-
-            field_surf = pygame.Surface(field_size)
-            field_surf.fill(BGCOLOR)
-
-            field_surf.blit(field_text_surf, (PADDING, bh // 2 - field_text_surf.get_rect().height // 2))
-
-            block.field_ps = ((text_surf.get_rect().width + PADDING * 2 + BORDER + block.pos[0], by + BORDER), field_size)
-            block_surf.blit(field_surf, (text_surf.get_rect().width + PADDING * 2 + BORDER, BORDER))
-
-        # blit surfaces
-        block_surf.blit(text_surf, (text_x, bh // 2 - text_surf.get_rect().height // 2 + BORDER))
-        display.blit(block_surf, block.pos)
-
-        # handle children
-        cur_height = bh + BORDER * 2
-        for i, child in enumerate(block.children):
-            child.pos = (bx + INDENT, by + cur_height)
-            cur_height += child.abs_height()
-        
-        tasks.extend(block.children[:])
-
+        child_offsets, extent = block.layout[4:]
+        if bx > view.right or by > view.bottom or bx + extent < view.left or by + block.abs_height() < view.top:
+            continue # whole subtree is out of view
+        rect = pygame.Rect(block.pos, (block.size[0] + BORDER * 2, block.size[1] + BORDER * 2))
+        if rect.colliderect(view): # slot items are inside the block
+            surf = block_surface(block)
+            pos = to_screen(block.pos)
+            commands.append((surf, pos, pygame.Rect(pos, surf.get_size())))
+            if isinstance(block, blocks.SlotBlock):
+                tasks.extend(block.slots[i] for i in block.layout[1] if i in block.slots) # slot items in index order
+        if child_offsets:
+            first = max(0, bisect.bisect_right(child_offsets, (INDENT, view.top - by)) - 1)
+            last = bisect.bisect_right(child_offsets, (INDENT, view.bottom - by))
+            tasks.extend(block.children[first:last])
+    return commands
+
+# to be called once per frame, after update_layout(). earlier roots get drawn on top
+# the commands of a tree get reused until it changes or the camera moves
+def render(roots):
+    view = viewport()
+    key = (camera_pos, zoom, view.size)
+    for root in reversed(roots):
+        if root.commands == None or root.commands[0] != key:
+            root.commands = (key, tree_commands(root, view))
+        frame.extend(root.commands[1])
@@ -0,0 +1,56 @@
+# live.py lets watch mode (see Game.toggle_watch) reuse what its earlier runs computed, so re-running the program
+# after every edit only recomputes the parts the edit could have changed. no pygame in here, it runs in the worker
+# blocks that run at most once per run get a Memo (see blocks.Memo) keyed on every variable they read or assign.
+# editing a block drops the caches of everything containing it (BaseBlock.invalidate), and the blocks that read a
+# variable whose value changed find a different key. the caches stay on the blocks (block.live_cache) between runs,
+# the worker gets and sends them back by block number like the profiler results, see profiler.program_blocks
+
+# LOCAL MODULES #
+import blocks
+import profiler
+
+LIVE_SIZE = 4 # cached runs per block, so a variable changing back still finds the results from before
+
+# blocks that can run what's inside them any number of times each time they run
+REPEATING = (blocks.WhileBlock, blocks.ForBlock, blocks.EachBlock, blocks.ParallelBlock, blocks.FuncBlock)
+# blocks that do more than assign variables, replaying their variables wouldn't be the same as running them
+EFFECTS = (blocks.PrintBlock, blocks.ArrayOpBlock)
+
+# the blocks inside start blocks that run at most once per run, loops count but not what's inside them
+def once_blocks(global_blocks):
+    found = []
+    pending = [child for root in global_blocks if isinstance(root, blocks.StartBlock) for child in root.children]
+    while pending:
+        block = pending.pop()
+        found.append(block)
+        if not isinstance(block, REPEATING):
+            pending.extend(block.nested())
+    return found
+
+# leaves and constants (which get folded anyway) aren't worth it, function calls can assign anything
+def cacheable(block):
+    if not block.nested() or block.constant()[0] or block.writes() == None: return False
+    return not any(isinstance(found, EFFECTS) for found in block.subtree())
+
+# gets installed as blocks.live before anything is compiled, with the caches of the earlier runs by block number
+class LiveCache:
+    def __init__(self, global_blocks, caches):
+        self.numbers = {id(block): i for i, block in enumerate(profiler.program_blocks(global_blocks))}
+        self.memos = {} # block number -> Memo
+        for block in once_blocks(global_blocks):
+            if cacheable(block):
+                # replayed in the order they get assigned, so new variables show up in the panel like they do after a run
+                written = tuple(dict.fromkeys(found.assigns() for found in profiler.program_blocks([block]) if found.assigns() != None))
+                memo = blocks.Memo(block, tuple(sorted(block.reads() | set(written))), written, adaptive = False, size = LIVE_SIZE)
+                i = self.numbers[id(block)]
+                if i in caches:
+                    memo.cache = caches[i]
+                self.memos[i] = memo
+
+    def wrap(self, block, fn):
+        memo = self.memos.get(self.numbers.get(id(block)))
+        return fn if memo == None else memo.wrap(fn)
+
+    # block number -> cache, picklable so the worker can send it back
+    def results(self):
+        return {i: memo.cache for i, memo in self.memos.items() if memo.cache}
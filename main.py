@@ -10,6 +10,9 @@ import blocks
 # instance of the game class, class is used for organization
 GAME_INSTANCE = game.Game()
 
+FRAME_CAP = 60 # most frames drawn per second, 0 for no cap
+IDLE_WAIT = True # while no program runs, sleep until there's input instead of drawing frames that look the same
+
 # UI VARIABLES AND FUNCTIONS #
 # using a single dictionary and function makes implementing UI easier
 toggleables = {
@@ -18,13 +21,14 @@ toggleables = {
     "d_cont": False,
     "d_tutr": True,
     "d_prob": False,
+    "d_cons": True,
 }
 def toggle(x):
     if x in toggleables:
         toggleables[x] = not toggleables[x]
 
-temp_instances = [getattr(blocks, block_class)() for block_class in shared.INSERT_OPTIONS]
-insert_buttons = [(block.label, block.color) for block in temp_instances]
+insert_classes = [getattr(blocks, block_class) for block_class in shared.INSERT_OPTIONS]
+insert_buttons = [(block_class.default_label, block_class.default_color) for block_class in insert_classes]
 insert_menu_ps = [] # contains position and size of insert menu buttons for click detection
 
 # INPUT MAP #
@@ -37,8 +41,26 @@ input_map = {
     pygame.K_TAB: (toggle, ["d_prob"]),
     pygame.K_SPACE: (toggle, ["d_menu"]),
     pygame.K_RETURN: (GAME_INSTANCE.run, []),
+    pygame.K_ESCAPE: (GAME_INSTANCE.cancel, []),
+    pygame.K_m: (GAME_INSTANCE.toggle_step_mode, []),
+    pygame.K_i: (GAME_INSTANCE.toggle_exact_ints, []),
+    pygame.K_w: (GAME_INSTANCE.toggle_watch, []),
+    pygame.K_o: (toggle, ["d_cons"]),
+    pygame.K_PAGEUP: (GAME_INSTANCE.console.scroll_by, [graphics.CONSOLE_ROWS, graphics.CONSOLE_ROWS]),
+    pygame.K_PAGEDOWN: (GAME_INSTANCE.console.scroll_by, [-graphics.CONSOLE_ROWS, graphics.CONSOLE_ROWS]),
+    pygame.K_p: (GAME_INSTANCE.toggle_pause, []),
+    pygame.K_s: (GAME_INSTANCE.step, []),
+    pygame.K_F5: (GAME_INSTANCE.save, []),
+    pygame.K_F9: (GAME_INSTANCE.load, []),
+    pygame.K_F2: (GAME_INSTANCE.toggle_profiling, []),
+    pygame.K_F3: (GAME_INSTANCE.export_profile, []),
     pygame.K_LEFT: (GAME_INSTANCE.inc_level, [-1]),
     pygame.K_RIGHT: (GAME_INSTANCE.inc_level, [1]),
+    pygame.K_UP: (graphics.pan, [0, -graphics.PAN_STEP]),
+    pygame.K_DOWN: (graphics.pan, [0, graphics.PAN_STEP]),
+    pygame.K_EQUALS: (graphics.zoom_at, [1]),
+    pygame.K_MINUS: (graphics.zoom_at, [-1]),
+    pygame.K_HOME: (graphics.reset_camera, []),
 }
 
 def insert_menu_detection(pos):
@@ -47,18 +69,39 @@ def insert_menu_detection(pos):
             toggleables["d_menu"] = False
             GAME_INSTANCE.begin_place(shared.INSERT_OPTIONS[i])
 
+# nothing changes on screen without input while no program is running. the mouse moving only matters for the ghost
+def is_idle():
+    return IDLE_WAIT and not closed and not GAME_INSTANCE.execution
+
+def wait_events():
+    while True:
+        event = pygame.event.wait()
+        if event.type != pygame.MOUSEMOTION or GAME_INSTANCE.placing:
+            return [event] + pygame.event.get()
+
 # handle pygame events
 closed = False
-def handle_events():
-    global closed
-    for event in pygame.event.get(): # catch any events
+exposed = False # window contents got lost (e.g. uncovered), the whole screen needs repainting
+def handle_events(events):
+    global closed, exposed
+    for event in events: # catch any events
         if event.type == pygame.QUIT:
             closed = True # breaks out of the main loop
+        elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            exposed = True
         elif event.type == pygame.KEYDOWN:
             if GAME_INSTANCE.typing:
                 GAME_INSTANCE.handle_typing(event) # adds the unicode character to the currently editing fieldblock
             elif event.key in input_map:
                 input_map[event.key][0](*input_map[event.key][1]) # calls the function associated with the key code
+        elif event.type == pygame.MOUSEWHEEL and not GAME_INSTANCE.typing:
+            mods = pygame.key.get_mods()
+            if mods & pygame.KMOD_CTRL:
+                graphics.zoom_at(event.y, pygame.mouse.get_pos())
+            elif mods & pygame.KMOD_SHIFT:
+                graphics.pan(-event.y * graphics.PAN_STEP, 0)
+            else:
+                graphics.pan(event.x * graphics.PAN_STEP, -event.y * graphics.PAN_STEP)
         elif event.type == pygame.MOUSEBUTTONDOWN and not GAME_INSTANCE.typing: # any mouse inputs should be ignored if typing
             pos = pygame.mouse.get_pos()
 
@@ -66,6 +109,7 @@ def handle_events():
                 if toggleables["d_menu"]: # if insert menu is open, check if any buttons were clicked
                     insert_menu_detection(pos)
                 else:
+                    pos = graphics.to_world(pos) # blocks are in world coordinates, see graphics.to_world
                     target = GAME_INSTANCE.identify_block(pos)
 
                     if pygame.key.get_pressed()[pygame.K_LSHIFT] : # cloning block feature, if lshift is held
@@ -76,32 +120,53 @@ def handle_events():
                         if not GAME_INSTANCE.typing: # if not interacting with a FieldBlock
                             (GAME_INSTANCE.end_place if GAME_INSTANCE.placing else GAME_INSTANCE.begin_move)(target, pos)
             elif event.button == 3 and not toggleables["d_menu"]: # RMB
-                GAME_INSTANCE.delete_block(pos)
+                GAME_INSTANCE.delete_block(graphics.to_world(pos))
+            elif event.button == 2 and not toggleables["d_menu"] and not GAME_INSTANCE.placing: # MMB
+                GAME_INSTANCE.cycle_memo(graphics.to_world(pos))
 
 # GAME LOOP #
-while not closed:
-    handle_events()
-
-    tasks = GAME_INSTANCE.global_blocks[:] # clone list of root blocks for initial rendering tasks
-
-    # update ghost
-    if GAME_INSTANCE.placing:
-        mx, my = pygame.mouse.get_pos()
-        sx, sy = GAME_INSTANCE.ghost.size
-        GAME_INSTANCE.ghost.pos = (mx - sx // 2, my - sy // 2)
-        tasks.append(GAME_INSTANCE.ghost)
-
-    # render everything
-    graphics.prepare() # clears screen
-    graphics.render(tasks) # renders block_defs
-    graphics.display_level(GAME_INSTANCE.level) # displays level
-    # render toggleables
-    if toggleables["d_vars"]: graphics.display_vars(blocks.global_vars) # variable display
-    if toggleables["d_prob"]: graphics.display_problem(shared.LEVEL_DATA[GAME_INSTANCE.level][0]) # problem statement dialog
-    if toggleables["d_menu"]: insert_menu_ps = graphics.display_insert_menu(insert_buttons) # insert menu
-    if toggleables["d_cont"]: graphics.display_controls() # controls dialog
-    if toggleables["d_tutr"]: graphics.display_tutorial() # tutorial dialog
-    graphics.finish() # update display
-
-pygame.quit() # properly clean up
-
+# guarded, worker processes import this module again on platforms that spawn instead of fork
+def main():
+    global insert_menu_ps, exposed
+    graphics.init() # opens the window, so only the main process should do it
+    clock = pygame.time.Clock()
+
+    events = []
+    while not closed:
+        handle_events(events + pygame.event.get())
+        GAME_INSTANCE.update() # poll the running program, if any
+
+        # update ghost
+        if GAME_INSTANCE.placing:
+            mx, my = graphics.to_world(pygame.mouse.get_pos())
+            sx, sy = GAME_INSTANCE.ghost.size
+            GAME_INSTANCE.ghost.pos = (mx - sx // 2, my - sy // 2)
+
+        # render everything
+        if exposed:
+            graphics.redraw_all()
+            exposed = False
+        graphics.prepare() # starts a new frame
+        if GAME_INSTANCE.placing: # ghost goes underneath and isn't indexed for clicks
+            graphics.update_layout([GAME_INSTANCE.ghost])
+            graphics.render([GAME_INSTANCE.ghost])
+        graphics.update_layout(GAME_INSTANCE.global_blocks, GAME_INSTANCE.index)
+        graphics.render(GAME_INSTANCE.global_blocks) # renders block_defs
+        graphics.display_level(GAME_INSTANCE.level) # displays level
+        if GAME_INSTANCE.execution: graphics.display_status(GAME_INSTANCE.run_status())
+        # render toggleables
+        if toggleables["d_vars"]: graphics.display_vars(blocks.global_vars) # variable display
+        if toggleables["d_cons"]: graphics.display_console(GAME_INSTANCE.console) # program output
+        if toggleables["d_prob"]: graphics.display_problem(shared.LEVEL_DATA[GAME_INSTANCE.level][0]) # problem statement dialog
+        if toggleables["d_menu"]: insert_menu_ps = graphics.display_insert_menu(insert_buttons) # insert menu
+        if toggleables["d_cont"]: graphics.display_controls() # controls dialog
+        if toggleables["d_tutr"]: graphics.display_tutorial() # tutorial dialog
+        graphics.finish() # update display
+        clock.tick(FRAME_CAP)
+        events = wait_events() if is_idle() else [] # the frame is on screen, now sleep until something happens
+
+    GAME_INSTANCE.cancel() # don't leave a worker running
+    pygame.quit() # properly clean up
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# profiler.py records how often every block runs and how long it takes, for the heatmap and the text report
+# while blocks.profiler is set, get_compiled() wraps every closure it builds with timing code (see Profiler.wrap),
+# so runs that aren't profiled compile and execute exactly like before. no pygame in here, it runs in the worker
+
+# LIBRARY IMPORTS #
+import time
+
+# LOCAL MODULES #
+import blocks
+
+# every block of the program in pre-order. the worker gets a pickled copy of the program, so blocks are matched
+# up with their copies by their position in this list
+def program_blocks(global_blocks):
+    found = []
+    pending = list(reversed(global_blocks))
+    while pending:
+        block = pending.pop()
+        found.append(block)
+        pending.extend(reversed(block.nested()))
+    return found
+
+# collects the numbers for one run, gets installed as blocks.profiler before anything is compiled
+class Profiler:
+    def __init__(self, global_blocks):
+        self.numbers = {id(block): i for i, block in enumerate(program_blocks(global_blocks))}
+        self.counts = [0] * len(self.numbers)
+        self.total = [0.0] * len(self.numbers) # including everything the block ran
+        self.own = [0.0] * len(self.numbers) # without the time spent in wrapped blocks it ran
+        self.stack = [0.0] # time spent in wrapped blocks, per block that is currently running
+
+    def wrap(self, block, fn):
+        i = self.numbers.get(id(block))
+        if i == None: return fn # not part of the program
+        counts, total, own, stack = self.counts, self.total, self.own, self.stack
+        clock = time.perf_counter
+        def run():
+            stack.append(0.0)
+            start = clock()
+            try:
+                return fn()
+            finally:
+                elapsed = clock() - start
+                inner = stack.pop()
+                stack[-1] += elapsed
+                counts[i] += 1
+                total[i] += elapsed
+                own[i] += elapsed - inner
+        return run
+
+    # (count, total seconds, own seconds) per block number, picklable so the worker can send it back
+    def results(self):
+        return list(zip(self.counts, self.total, self.own))
+
+# profiles the program in this process instead of a worker, returns the results
+# compiled closures get thrown away before and after, so the timing wrappers don't stick around
+def profile_program(global_blocks, run):
+    program = program_blocks(global_blocks)
+    for block in program:
+        block.clear_compiled(block.parent)
+    profiler = blocks.profiler = Profiler(global_blocks)
+    try:
+        run()
+    finally:
+        blocks.profiler = None
+        for block in program:
+            block.clear_compiled(block.parent)
+    return profiler.results()
+
+# REPORTS #
+# profile results matched up with the blocks they belong to
+class Report:
+    def __init__(self, program, results):
+        self.entries = [(block, *result) for block, result in zip(program, results) if result[0]]
+        self.entries.sort(key = lambda entry: entry[3], reverse = True) # hottest first
+        self.own_time = sum(entry[3] for entry in self.entries)
+
+    # block -> (heat from 0 to 1 relative to the hottest block, execution count), see graphics.compose
+    def heatmap(self):
+        hottest = self.entries[0][3] if self.entries else 0.0
+        return {block: (own / hottest if hottest else 0.0, count) for block, count, _, own in self.entries}
+
+    def lines(self):
+        executions = sum(entry[1] for entry in self.entries)
+        lines = [
+            f"PyBlocks profile: {self.own_time:.3f}s in blocks, {executions} block executions",
+            "(own time leaves out the blocks a block ran, total includes them)",
+            "",
+            f"{'own %':>7} {'own s':>9} {'total s':>9} {'count':>10}  block",
+        ]
+        for block, count, total, own in self.entries:
+            share = own / self.own_time * 100 if self.own_time else 0.0
+            lines.append(f"{share:>6.1f}% {own:>9.4f} {total:>9.4f} {count:>10}  {describe(block)}")
+        return lines
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write("\n".join(self.lines()) + "\n")
+
+# label (and field) of the block and everything containing it, e.g. Start > While > Set[0] > Var a
+def describe(block):
+    parts = []
+    while block:
+        part = block.label + (f" {block.field}" if isinstance(block, blocks.FieldBlock) else "")
+        parent = block.parent
+        if parent and block not in parent.children:
+            part += f"[{next(i for i, item in parent.slots.items() if item is block)}]" # slot index
+        parts.append(part)
+        block = parent
+    return " > ".join(reversed(parts))
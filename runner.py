@@ -0,0 +1,265 @@
+# runner.py runs block programs without freezing the game window, either in a separate process (WorkerRun)
+# or in-process a few thousand blocks at a time (StepRun). both have the same poll()/cancel() interface
+# nothing in here touches pygame, the worker process only needs the blocks module
+
+# LIBRARY IMPORTS #
+import atexit
+import contextlib
+import multiprocessing
+import multiprocessing.util # registers its exit handler now, so cancel_running gets registered after it (and runs first)
+import itertools
+import os
+import pickle
+import queue
+import signal
+import threading
+import time
+try:
+    import resource # unix only, needed for memory limits
+except ImportError:
+    resource = None
+
+# LOCAL MODULES #
+import blocks
+import console
+import live
+import profiler
+
+RUN_TIMEOUT = 60.0 # wall-clock seconds before a run gets killed, None to let it run forever
+SNAPSHOT_INTERVAL = 0.1 # how often the worker sends global_vars back while running
+SNAPSHOT_ITEMS = 1000 # longer sequences and arrays only get sent as their summary while running, see blocks.value_text
+STEP_SLICE = 0.008 # seconds the step interpreter gets per poll(), leaves enough of a 60 FPS frame for rendering
+STEP_BATCH = 1000 # ops between clock checks
+
+# the picklable form of a program, global_fns goes along so CallBlocks resolve to the same functions
+# and exact_ints so the numbers come out the same. parallel_processes is how many processes Parallel blocks get
+def dump_program(global_blocks):
+    return pickle.dumps((global_blocks, blocks.global_fns, blocks.exact_ints, blocks.parallel_processes))
+
+def load_program(data):
+    global_blocks, blocks.global_fns, blocks.exact_ints, blocks.parallel_processes = pickle.loads(data)
+    return global_blocks
+
+# executes all start blocks, returns the resulting variables
+# compiled is what the game uses, interpret runs the execute() tree walker, step the step interpreter
+# the process pool Parallel blocks started gets closed once the run is over, see blocks.get_pool
+def execute_program(global_blocks, mode = "compiled"):
+    blocks.global_vars = {}
+    try:
+        if mode == "step":
+            for _ in program_steps(global_blocks):
+                pass
+            return blocks.global_vars
+        for root in global_blocks:
+            if isinstance(root, blocks.StartBlock):
+                if mode == "interpret":
+                    root.execute()
+                else:
+                    root.get_compiled()()
+        return blocks.global_vars
+    finally:
+        blocks.close_pool()
+
+# what gets sent of global_vars while the program is still running, the final values go back whole
+def snapshot(global_vars):
+    # copied first, the program thread can add variables while this goes through them
+    return {label: blocks.value_text(val) if is_long(val) else val for label, val in dict(global_vars).items()}
+
+def is_long(value):
+    return (blocks.is_sequence(value) or blocks.is_array(value)) and len(value) > SNAPSHOT_ITEMS
+
+# entry point of the worker process. the program runs on a thread so the main thread is free to stream snapshots
+# profiled runs send the profiler results along with every snapshot, so cancelled runs still have some
+# watch mode runs get the caches of the earlier runs (see live.py) and send them back once they're done
+# printed lines get buffered and sent as ("output", (lines, dropped)) messages, unless the run is quiet. they go
+# whenever the buffer fills up and before every snapshot, so no line gets dropped and they arrive in order
+def worker_main(data, results, profile = False, memory_limit = None, quiet = False, caches = None):
+    # the worker leads its own process group, so cancel() can stop the pool Parallel blocks start along with it
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+    if memory_limit != None: # going over it raises MemoryError, which ends the run like any other error
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    if quiet: # whatever the program prints goes nowhere
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            worker_run(data, results, profile, caches)
+    else:
+        blocks.output = console.Console(sink = lambda batch: results.put(("output", batch)))
+        worker_run(data, results, profile, caches)
+
+def worker_run(data, results, profile, caches):
+    global_blocks = load_program(data)
+    error = []
+    if profile:
+        blocks.profiler = profiler.Profiler(global_blocks)
+    if caches != None:
+        blocks.live = live.LiveCache(global_blocks, caches)
+    profile_results = lambda: blocks.profiler.results() if profile else None
+    send_output = lambda: blocks.output.send() if blocks.output != None else None
+
+    def target():
+        try:
+            execute_program(global_blocks)
+        except Exception as e:
+            error.append(f"{type(e).__name__}: {e}")
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    while thread.is_alive():
+        thread.join(SNAPSHOT_INTERVAL)
+        if thread.is_alive():
+            send_output()
+            results.put(("vars", snapshot(blocks.global_vars), profile_results()))
+    live_results = blocks.live.results() if caches != None else None
+    send_output()
+    results.put(("done", blocks.global_vars, profile_results(), error[0] if error else None, live_results))
+
+# worker runs that haven't finished yet. workers aren't daemonic (Parallel blocks start processes, which daemonic
+# ones aren't allowed to), so they get cancelled when the game exits instead of the exit waiting for them
+running = set()
+
+def cancel_running():
+    for run in list(running):
+        run.cancel("exiting")
+
+atexit.register(cancel_running) # before multiprocessing's exit handler would wait for the workers to finish
+
+# handle to a program running in a worker process, poll() it once per frame
+# memory_limit is in bytes (unix only), quiet throws away whatever the program prints
+# caches turns on watch mode caching, block number -> cache of the earlier runs (empty for the first one)
+# what the program prints goes to output (a console.Console) as it arrives, or nowhere without one
+class WorkerRun:
+    def __init__(self, global_blocks, timeout = RUN_TIMEOUT, profile = False, memory_limit = None, quiet = False, caches = None, output = None):
+        self.timeout = timeout
+        self.output = output
+        self.global_vars = {}
+        self.done = False
+        self.error = None # set if the program raised, timed out or got cancelled
+        self.timed_out = False
+        self.profile = None # latest profiler results, for profiler.program_blocks(global_blocks) as it was passed in
+        self.caches = None # watch mode caches after a finished run, numbered the same way
+
+        self.results = multiprocessing.Queue()
+        args = (dump_program(global_blocks), self.results, profile, memory_limit, quiet, caches)
+        self.process = multiprocessing.Process(target=worker_main, args=args)
+        self.start_time = time.perf_counter()
+        self.process.start()
+        running.add(self)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    # takes in whatever the worker sent, returns true once the run is over
+    def poll(self):
+        if self.done: return True
+        try:
+            while True:
+                msg = self.results.get_nowait()
+                if msg[0] == "output":
+                    if self.output != None:
+                        self.output.extend(*msg[1])
+                    continue
+                self.global_vars = msg[1]
+                if msg[2] != None:
+                    self.profile = msg[2]
+                if msg[0] == "done":
+                    self.error = msg[3]
+                    self.caches = msg[4]
+                    self.done = True
+                    self.process.join()
+                    running.discard(self)
+                    return True
+        except queue.Empty:
+            pass
+
+        if self.timeout != None and self.elapsed() > self.timeout:
+            self.cancel(f"timed out after {self.timeout}s")
+            self.timed_out = True
+        elif not self.process.is_alive() and self.results.empty():
+            self.cancel(f"worker exited with code {self.process.exitcode}")
+        return self.done
+
+    def cancel(self, reason = "cancelled"):
+        if self.done: return
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM) # the worker and any pool processes it started
+        except (AttributeError, OSError): # windows, or the worker didn't get to making its group yet
+            pass
+        self.process.terminate()
+        self.process.join()
+        self.error = reason
+        self.done = True
+        running.discard(self)
+
+
+# generator over every start block's steps(), see BaseBlock.steps
+def program_steps(global_blocks):
+    for root in global_blocks[:]:
+        if isinstance(root, blocks.StartBlock):
+            yield from root.steps()
+
+# handle to a program running in-process on the step interpreter, poll() advances it by a time slice
+# it runs on the live blocks (no copy like the worker), so edits made while paused affect the rest of the run
+class StepRun:
+    def __init__(self, global_blocks, timeout = RUN_TIMEOUT, time_slice = STEP_SLICE):
+        self.timeout = timeout
+        self.time_slice = time_slice
+        self.done = False
+        self.error = None
+        self.paused = False
+        self.ops = 0 # blocks executed so far
+        self.run_time = 0.0 # time spent actually executing, for ops/sec
+
+        blocks.global_vars = {}
+        self.program = program_steps(global_blocks)
+        self.start_time = time.perf_counter()
+
+    # the program writes straight into blocks.global_vars
+    @property
+    def global_vars(self):
+        return blocks.global_vars
+
+    def elapsed(self):
+        return time.perf_counter() - self.start_time
+
+    def ops_per_sec(self):
+        return self.ops / self.run_time if self.run_time else 0.0
+
+    # runs at most max_ops blocks, returns how many actually ran
+    def advance(self, max_ops):
+        if self.done: return 0
+        start = time.perf_counter()
+        ran = 0
+        try:
+            for ran, _ in enumerate(itertools.islice(self.program, max_ops), 1):
+                pass
+            if ran < max_ops: # generator ran out, program finished
+                self.done = True
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.done = True
+        self.ops += ran
+        self.run_time += time.perf_counter() - start
+        return ran
+
+    def poll(self):
+        if self.done: return True
+        if not self.paused:
+            end = time.perf_counter() + self.time_slice
+            while not self.done and time.perf_counter() < end:
+                self.advance(STEP_BATCH)
+        if not self.done and self.timeout != None and self.run_time > self.timeout:
+            self.cancel(f"timed out after {self.timeout}s")
+        return self.done
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    # executes a single block, used while paused
+    def step(self):
+        self.advance(1)
+
+    def cancel(self, reason = "cancelled"):
+        if self.done: return
+        self.program.close()
+        self.error = reason
+        self.done = True
@@ -0,0 +1,274 @@
+# serialize.py saves and loads block programs (the Game.global_blocks forest) in a versioned format
+# there's a readable JSON form (nested objects) and a compact binary form (a flat pre-order stream of blocks),
+# save_file/load_file pick one by file extension. neither needs pygame
+
+# LIBRARY IMPORTS #
+import json
+
+# LOCAL MODULES #
+import blocks
+
+VERSION = 2 # 2 added FuncBlock.cacheable, version 1 files still load
+MAGIC = b"PYBK"
+
+# flags stored per block in the binary form
+HAS_FIELD = 1
+REGISTERED = 2 # FuncBlock is the one global_fns points to for its name
+HAS_POS = 4 # root blocks keep where they were placed
+MEMO = 8 # FuncBlock.cacheable is True
+NO_MEMO = 16 # FuncBlock.cacheable is False
+
+def type_name(block):
+    return type(block).__name__ # operators are classes too, see blocks.operator_class
+
+def is_registered(block):
+    return isinstance(block, blocks.FuncBlock) and blocks.global_fns.get(block.field) is block
+
+# memoization setting of a FuncBlock, None for every other block
+def cacheable(block):
+    return block.cacheable if isinstance(block, blocks.FuncBlock) else None
+
+# creates an empty block of a type, fields and nested blocks get filled in by the loaders
+# only block classes, a file could name anything in blocks otherwise
+def make_block(name, field):
+    block_class = getattr(blocks, name, None)
+    if not (isinstance(block_class, type) and issubclass(block_class, blocks.BaseBlock)):
+        raise ValueError(f"unknown block type {name!r}")
+    if block_class is blocks.FuncBlock:
+        # its constructor registers it as "func". register_functions redoes that once the whole file loaded,
+        # until then global_fns stays the one of the program on screen in case the load fails partway
+        fns = dict(blocks.global_fns)
+        block = block_class()
+        blocks.global_fns.clear()
+        blocks.global_fns.update(fns)
+    else:
+        block = block_class()
+    if field != None:
+        block.field = field
+        if isinstance(block, blocks.FuncBlock):
+            block.prev_field = field
+    return block
+
+def attach_slot(parent, i, item):
+    item.parent = parent
+    item.valid_parent = False # same as SlotBlock.fill_slot
+    parent.slots[i] = item
+
+def attach_child(parent, child):
+    child.parent = parent
+    parent.children.append(child)
+
+# FuncBlock constructors register themselves, which has to be redone from the saved flags
+def register_functions(funcs):
+    fns = {}
+    for block, registered in funcs:
+        if registered or block.field not in fns:
+            fns[block.field] = block if registered else None
+    blocks.global_fns = fns
+
+# sub-blocks of a block in saved order, slot items (by index) then children
+def nested(block):
+    slots = sorted(block.slots.items()) if isinstance(block, blocks.SlotBlock) else []
+    return slots, block.children
+
+# JSON FORM #
+def block_to_json(block, root = False):
+    data = {"type": type_name(block)}
+    if isinstance(block, blocks.FieldBlock):
+        data["field"] = block.field
+    if is_registered(block):
+        data["registered"] = True
+    if cacheable(block) != None:
+        data["cacheable"] = block.cacheable
+    if root:
+        data["pos"] = list(block.pos)
+    slots, children = nested(block)
+    if slots:
+        data["slots"] = {str(i): block_to_json(item) for i, item in slots}
+    if children:
+        data["children"] = [block_to_json(child) for child in children]
+    return data
+
+def dumps_json(global_blocks):
+    return json.dumps({"format": "pyblocks", "version": VERSION, "blocks": [block_to_json(root, True) for root in global_blocks]}, indent = 1)
+
+# builds blocks from the parsed JSON without recursion, so deep programs load fine
+def loads_json(text):
+    data = json.loads(text)
+    if data.get("format") != "pyblocks" or data.get("version", 0) > VERSION:
+        raise ValueError("not a supported pyblocks program")
+
+    funcs = []
+    def build(node):
+        block = make_block(node["type"], node.get("field"))
+        if isinstance(block, blocks.FuncBlock):
+            block.cacheable = node.get("cacheable")
+            funcs.append((block, node.get("registered", False)))
+        return block
+
+    global_blocks = []
+    tasks = []
+    for node in data["blocks"]:
+        root = build(node)
+        root.pos = tuple(node.get("pos", (0, 0)))
+        global_blocks.append(root)
+        tasks.append((root, node))
+    while tasks:
+        block, node = tasks.pop()
+        for i, item_node in sorted(node.get("slots", {}).items(), key = lambda kv: int(kv[0])):
+            item = build(item_node)
+            attach_slot(block, int(i), item)
+            tasks.append((item, item_node))
+        for child_node in node.get("children", []):
+            child = build(child_node)
+            attach_child(block, child)
+            tasks.append((child, child_node))
+
+    register_functions(funcs)
+    return global_blocks
+
+# BINARY FORM #
+# header: MAGIC, version byte, type name table, root count. then every block in pre-order as
+# type id, flags, [field], slot mask (bit i set = slot i filled), child count, [pos]
+# numbers are varints, strings are a varint length followed by utf-8
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def write_str(out, text):
+    data = text.encode("utf-8")
+    write_varint(out, len(data))
+    out += data
+
+def zigzag(n): # signed -> unsigned, positions can be negative
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+def dumps_binary(global_blocks):
+    types = {}
+    body = bytearray()
+    tasks = [(root, True) for root in reversed(global_blocks)]
+    while tasks:
+        block, root = tasks.pop()
+        name = type_name(block)
+        if name not in types: types[name] = len(types)
+        slots, children = nested(block)
+
+        flags = (HAS_FIELD if isinstance(block, blocks.FieldBlock) else 0) | (REGISTERED if is_registered(block) else 0) | (HAS_POS if root else 0)
+        flags |= {None: 0, True: MEMO, False: NO_MEMO}[cacheable(block)]
+        write_varint(body, types[name])
+        body.append(flags)
+        if flags & HAS_FIELD: write_str(body, block.field)
+        write_varint(body, sum(1 << i for i, _ in slots))
+        write_varint(body, len(children))
+        if root:
+            write_varint(body, zigzag(block.pos[0]))
+            write_varint(body, zigzag(block.pos[1]))
+
+        # pre-order, so push in reverse
+        tasks.extend((child, False) for child in reversed(children))
+        tasks.extend((item, False) for _, item in reversed(slots))
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    write_varint(out, len(types))
+    for name in types:
+        write_str(out, name)
+    write_varint(out, len(global_blocks))
+    return bytes(out + body)
+
+# reads the stream front to back in one pass, rebuilding blocks as they come
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.i = 0
+
+    def byte(self):
+        self.i += 1
+        return self.data[self.i - 1]
+
+    def varint(self):
+        n = shift = 0
+        while True:
+            b = self.data[self.i]
+            self.i += 1
+            n |= (b & 0x7f) << shift
+            if b < 0x80: return n
+            shift += 7
+
+    def str(self):
+        length = self.varint()
+        self.i += length
+        return str(self.data[self.i - length:self.i], "utf-8")
+
+    def signed(self):
+        n = self.varint()
+        return n // 2 if n % 2 == 0 else -(n + 1) // 2
+
+def loads_binary(data):
+    if bytes(data[:4]) != MAGIC:
+        raise ValueError("not a pyblocks program")
+    reader = Reader(data)
+    reader.i = 4
+    if reader.byte() > VERSION:
+        raise ValueError("program was saved by a newer version")
+    types = [reader.str() for _ in range(reader.varint())]
+    roots_count = reader.varint()
+
+    funcs = []
+    def read_block():
+        name = types[reader.varint()]
+        flags = reader.byte()
+        block = make_block(name, reader.str() if flags & HAS_FIELD else None)
+        if isinstance(block, blocks.FuncBlock):
+            block.cacheable = True if flags & MEMO else False if flags & NO_MEMO else None
+            funcs.append((block, bool(flags & REGISTERED)))
+        mask = reader.varint()
+        slots = [i for i in range(mask.bit_length()) if mask >> i & 1]
+        children = reader.varint()
+        if flags & HAS_POS:
+            block.pos = (reader.signed(), reader.signed())
+        return [block, slots, children]
+
+    global_blocks = []
+    for _ in range(roots_count):
+        stack = [read_block()]
+        global_blocks.append(stack[0][0])
+        while stack:
+            top = stack[-1]
+            if top[1]:
+                entry = read_block()
+                attach_slot(top[0], top[1].pop(0), entry[0])
+                stack.append(entry)
+            elif top[2]:
+                top[2] -= 1
+                entry = read_block()
+                attach_child(top[0], entry[0])
+                stack.append(entry)
+            else:
+                stack.pop()
+
+    register_functions(funcs)
+    return global_blocks
+
+# FILES #
+def save_file(path, global_blocks):
+    if path.endswith(".json"):
+        with open(path, "w", encoding = "utf-8") as f:
+            f.write(dumps_json(global_blocks))
+    else:
+        with open(path, "wb") as f:
+            f.write(dumps_binary(global_blocks))
+
+# also registers the program's functions in blocks.global_fns
+# damaged files raise ValueError like files that aren't programs at all
+def load_file(path):
+    try:
+        if path.endswith(".json"):
+            with open(path, encoding = "utf-8") as f:
+                return loads_json(f.read())
+        with open(path, "rb") as f:
+            return loads_binary(f.read())
+    except (IndexError, KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"damaged program ({type(e).__name__}: {e})") from e
@@ -15,6 +15,14 @@ LEVEL_DATA = {
     10: ("Congratulations! You've completed all of the levels.", None),
 }
 
+# checks if the 'goal' variable holds the expected value for level, used when a program finishes running
+def check_level(level, global_vars):
+    return "goal" in global_vars and global_vars["goal"] == LEVEL_DATA[level][1]
+
+# levels whose expected value the program's 'goal' variable matches
+def passed_levels(global_vars):
+    return [level for level, data in LEVEL_DATA.items() if data[1] != None and check_level(level, global_vars)]
+
 # blocks that will appear on the insert menu
 INSERT_OPTIONS = [
     "StartBlock",
@@ -26,7 +34,9 @@ INSERT_OPTIONS = [
     "IncBlock", "DecBlock",
     "VarBlock", "SetBlock",
     "FuncBlock", "CallBlock",
-    "IfBlock", "WhileBlock", "ForBlock",
+    "IfBlock", "WhileBlock", "ForBlock", "ParallelSumBlock", "ParallelCountBlock", "ParallelMaxBlock",
+    "RangeBlock", "MapBlock", "FilterBlock", "SumBlock", "CountBlock", "MinBlock", "MaxBlock",
+    "ArrayBlock", "GetBlock", "PutBlock", "AppendBlock",
 ]
 
 # checks collision between rectangle and point
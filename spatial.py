@@ -0,0 +1,72 @@
+# spatial.py contains a uniform grid over block rectangles, so finding the block under the mouse doesn't need
+# to search the whole block forest. graphics.render keeps it up to date with the positions it assigns
+
+# LOCAL MODULES #
+import shared
+
+CELL_SIZE = 64 # pixels, blocks are 30px tall and usually a few hundred wide
+
+class SpatialIndex:
+    def __init__(self, cell_size = CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {} # (cx, cy) -> set of blocks overlapping that cell
+        self.rects = {} # block -> (pos, size) it was indexed with
+        self.ranks = {} # root block -> its place in the block forest, earlier roots win clicks
+
+    def clear(self):
+        self.cells = {}
+        self.rects = {}
+        self.ranks = {}
+
+    # remembers the order of the root blocks, so clicks don't have to search the forest for it
+    def rank_roots(self, roots):
+        self.ranks = {root: i for i, root in enumerate(roots)}
+
+    def cells_for(self, pos, size):
+        cs = self.cell_size
+        x, y = pos
+        w, h = size
+        return [(cx, cy) for cx in range(x // cs, (x + w) // cs + 1) for cy in range(y // cs, (y + h) // cs + 1)]
+
+    # (re)indexes block at its current position and size, cheap if it hasn't moved
+    def update(self, block):
+        rect = (block.pos, block.size)
+        old = self.rects.get(block)
+        if old == rect: return
+        if old: self.remove(block)
+        self.rects[block] = rect
+        for cell in self.cells_for(*rect):
+            self.cells.setdefault(cell, set()).add(block)
+
+    def remove(self, block):
+        rect = self.rects.pop(block, None)
+        if not rect: return
+        for cell in self.cells_for(*rect):
+            cell_blocks = self.cells[cell]
+            cell_blocks.discard(block)
+            if not cell_blocks:
+                del self.cells[cell]
+
+    # calls fn on a block and all of its children and slot items
+    def each_in_tree(self, block, fn):
+        tasks = [block]
+        while tasks:
+            block = tasks.pop()
+            fn(block)
+            tasks.extend(block.children)
+            if hasattr(block, "slots"):
+                tasks.extend(block.slots.values())
+
+    # (re)indexes a block along with its children and slot items
+    def update_tree(self, block):
+        self.each_in_tree(block, self.update)
+
+    # removes a block along with its children and slot items
+    def remove_tree(self, block):
+        self.each_in_tree(block, self.remove)
+
+    # every indexed block that contains point
+    def query(self, point):
+        cs = self.cell_size
+        cell = self.cells.get((point[0] // cs, point[1] // cs), ())
+        return [block for block in cell if shared.check_collision(block.pos, block.size, point)]
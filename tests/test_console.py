@@ -0,0 +1,64 @@
+# the output console: what fills up its ring buffer either gets counted as dropped or, with a sink, handed on
+# (the worker's console hands its lines to the game's, see runner.worker_main)
+
+# LIBRARY IMPORTS #
+import threading
+import time
+import unittest
+
+# LOCAL MODULES #
+import blocks
+import console
+import runner
+from tests.test_interpreters import for_block, inc, num, op, set_var, show, start, var
+
+# prints 0 to count - 1
+def counting(count):
+    return [start(for_block(set_var("i", num(0)), op(blocks.LsBlock, var("i"), num(count)), inc("i"), show(var("i"))))]
+
+class Buffer(unittest.TestCase):
+    def test_dropped(self):
+        lines = console.Console(size = 3)
+        for i in range(5):
+            lines.write(str(i))
+        lines.write("5\n6")
+        self.assertEqual(lines.take(), (["4", "5", "6"], 4))
+        self.assertEqual(lines.take(), ([], 0))
+
+    def test_sink(self):
+        batches = []
+        lines = console.Console(size = 10, sink = batches.append)
+        for i in range(25):
+            lines.write(str(i))
+        lines.send()
+        lines.send() # nothing left to send
+        self.assertEqual([dropped for _, dropped in batches], [0, 0, 0])
+        self.assertEqual([line for batch, _ in batches for line in batch], [str(i) for i in range(25)])
+
+    def test_threads(self): # every line gets taken or counted as dropped exactly once
+        lines = console.Console(size = 100)
+        count = 50000
+        writer = threading.Thread(target = lambda: [lines.write(str(i)) for i in range(count)])
+        taken, dropped = [], 0
+        writer.start()
+        while writer.is_alive():
+            batch, batch_dropped = lines.take()
+            taken += batch
+            dropped += batch_dropped
+        batch, batch_dropped = lines.take()
+        taken += batch
+        self.assertEqual(len(taken) + dropped + batch_dropped, count)
+        self.assertEqual(taken, sorted(taken, key = int))
+
+class Worker(unittest.TestCase):
+    def test_no_lines_lost(self): # more lines than the worker's buffer holds
+        count = console.CONSOLE_LINES * 3 + 7
+        lines = console.Console(size = count)
+        run = runner.WorkerRun(counting(count), timeout = 60, output = lines)
+        while not run.poll():
+            time.sleep(0.01)
+        self.assertEqual(run.error, None)
+        self.assertEqual(lines.take(), ([str(float(i)) for i in range(count)], 0))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+# exact integer mode (blocks.exact_ints): the interpreters have to agree with it on as well, and ints too big
+# for a float have to compare with floats without raising
+
+# LIBRARY IMPORTS #
+import contextlib
+import io
+import math
+import os
+import tempfile
+import unittest
+
+# LOCAL MODULES #
+import blocks
+import cli
+import serialize
+import tests.test_interpreters as interpreters
+from tests.test_interpreters import num, op, run, set_var, show, start, var
+
+HUGE = 2 ** 1100 # more than a float can hold
+
+class ExactMode(unittest.TestCase):
+    def setUp(self):
+        self.exact_ints = blocks.exact_ints
+        blocks.exact_ints = True
+
+    def tearDown(self):
+        blocks.exact_ints = self.exact_ints
+
+class ExactInterpretersAgree(ExactMode, interpreters.InterpretersAgree):
+    def test_ints(self): # whole numbers stay ints, the rest of the results match float mode
+        variables = self.check(interpreters.loops)[0]
+        self.assertIs(type(variables["s"]), int)
+        self.assertIs(type(self.check(interpreters.operators)[0]["b"]), float)
+
+# the rest of the comparisons of a huge int with a float, the operands typed so the compiled = and != get
+# specialized like in a real program (see specialize and operator_types)
+def comparisons():
+    big = op(blocks.MulBlock, num(1e200), num(1e200))
+    rest = lambda: op(blocks.ModBlock, var("big"), op(blocks.AddBlock, var("big"), num(1))) # the same huge int
+    return [start(
+        set_var("big", big),
+        set_var("eq", op(blocks.EqBlock, rest(), num(0.5))),
+        set_var("neq", op(blocks.NEqBlock, rest(), num(0.5))),
+        set_var("gr", op(blocks.GrBlock, rest(), num(1e300))),
+        set_var("ls", op(blocks.LsBlock, rest(), num(1e300))),
+        set_var("eq_big", op(blocks.EqBlock, num(1e300), rest())),
+    )]
+
+class HugeInts(ExactMode):
+    def test_operators(self):
+        # float, then whether HUGE is greater and whether it's less
+        cases = [(0.5, True, False), (-1e308, True, False), (1e308, True, False), (math.inf, False, True),
+            (-math.inf, True, False), (math.nan, False, False)]
+        for value, greater, less in cases:
+            for big in (HUGE, -HUGE):
+                with self.subTest(value = value, big = big):
+                    self.assertFalse(blocks.op_eq(big, value))
+                    self.assertFalse(blocks.op_eq(value, big))
+                    self.assertTrue(blocks.op_neq(big, value))
+                    self.assertTrue(blocks.op_neq(value, big))
+                    if big > 0:
+                        self.assertEqual((blocks.op_gr(big, value), blocks.op_ls(big, value)), (greater, less))
+                        self.assertEqual((blocks.op_ls(value, big), blocks.op_gr(value, big)), (greater, less))
+
+    def test_still_exact(self): # ints a float can hold still compare with floats like before
+        self.assertTrue(blocks.op_eq(2 ** 53, 2.0 ** 53))
+        self.assertTrue(blocks.op_eq(3, 3.0000000000000004))
+        self.assertTrue(blocks.op_neq(HUGE, HUGE + 1))
+
+    def test_interpreters(self):
+        expected = {"eq": False, "neq": True, "gr": True, "ls": False, "eq_big": False}
+        for mode in interpreters.MODES:
+            with self.subTest(mode = mode):
+                variables = run(comparisons, mode)[0]
+                self.assertEqual({name: variables[name] for name in expected}, expected)
+
+# squares 1e200 five times, 6400 digits is more than str() allows for an int
+# (the literal is the float closest to 1e200, a bit less than 10 ** 200)
+LONG_INT = int(1e200) ** 32
+LONG_INT_TEXT = "9.999999999e+6399 (6400 digits)"
+
+def long_int():
+    return [start(
+        set_var("x", num(1e200)),
+        *[set_var("x", op(blocks.MulBlock, var("x"), var("x"))) for _ in range(5)],
+        show(var("x")),
+    )]
+
+class LongInts(ExactMode):
+    def test_text(self):
+        self.assertEqual(blocks.value_text(10 ** 6400), "1.000000000e+6400 (6401 digits)")
+        self.assertEqual(blocks.value_text(1 - 10 ** 5000), "-9.999999999e+4999 (5000 digits)")
+        self.assertEqual(blocks.value_text(2 ** 25969), "2.805158453e+7817 (7818 digits)")
+        self.assertEqual(blocks.value_text((1, 10 ** 6400)), "[1, 1.000000000e+6400 (6401 digits)] (2 items)")
+        self.assertEqual(blocks.value_str(10 ** 4299), "1" + "0" * 4299) # short enough still shows in full
+
+    def test_print(self):
+        for mode in interpreters.MODES:
+            with self.subTest(mode = mode):
+                variables, output = run(long_int, mode)
+                self.assertEqual(variables["x"], LONG_INT)
+                self.assertEqual(output, LONG_INT_TEXT + "\n")
+
+    def test_cli(self):
+        blocks.global_fns.clear()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "program.json")
+            serialize.save_file(path, long_int())
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                cli.main([path, "--exact"])
+        self.assertIn(f"  x = {LONG_INT_TEXT}\n", output.getvalue())
+
+if __name__ == "__main__":
+    unittest.main()
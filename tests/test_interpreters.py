@@ -0,0 +1,137 @@
+# runs the same programs through execute(), the compiled closures and the step interpreter (runner.program_steps),
+# which all have to end up with the same variables and print the same lines
+
+# LIBRARY IMPORTS #
+import contextlib
+import io
+import unittest
+
+# LOCAL MODULES #
+import blocks
+import runner
+
+MODES = ("interpret", "compiled", "step")
+
+# helpers that build blocks like the editor would
+def num(value):
+    return blocks.NumBlock(str(float(value)))
+
+def var(name):
+    return blocks.VarBlock(name)
+
+def fill(block, *items):
+    for i, item in enumerate(items):
+        item.parent = block
+        block.slots[i] = item
+    return block
+
+def op(factory, a, b):
+    return fill(factory(), a, b)
+
+def set_var(name, value):
+    return fill(blocks.SetBlock(), var(name), value)
+
+def inc(name):
+    return fill(blocks.IncBlock(), var(name))
+
+def show(value):
+    return fill(blocks.PrintBlock(), value)
+
+def if_block(cond, *children):
+    return fill(blocks.IfBlock(children = list(children)), cond)
+
+def while_block(cond, *children):
+    return fill(blocks.WhileBlock(children = list(children)), cond)
+
+def for_block(init, cond, step, *children):
+    return fill(blocks.ForBlock(children = list(children)), init, cond, step)
+
+def start(*children):
+    return blocks.StartBlock(list(children))
+
+def divides(a, b): # b % a == 0
+    return op(blocks.EqBlock, op(blocks.ModBlock, b, a), num(0))
+
+# PROGRAMS #
+# each one builds a fresh program, FuncBlocks register themselves while getting built
+def operators():
+    return [start(
+        set_var("a", op(blocks.AddBlock, num(5), op(blocks.MulBlock, num(5), num(5)))),
+        set_var("b", op(blocks.DivBlock, num(7), num(2))),
+        set_var("c", op(blocks.ModBlock, num(17), num(5))),
+        set_var("d", op(blocks.DivBlock, num(1), num(0))), # fails, so d is None
+        set_var("e", op(blocks.AddBlock, blocks.TextBlock("x"), num(1))),
+        set_var("f", op(blocks.EqBlock, op(blocks.AddBlock, num(0.1), num(0.2)), num(0.3))),
+        set_var("g", op(blocks.AndBlock, blocks.TrueBlock(), fill(blocks.NotBlock(), blocks.FalseBlock()))),
+        set_var("h", fill(blocks.RndBlock(), num(2.5))),
+        show(var("a")), show(var("d")),
+    )]
+
+def loops():
+    return [start(
+        set_var("s", num(0)),
+        for_block(set_var("i", num(0)), op(blocks.LsBlock, var("i"), num(100)), inc("i"),
+            if_block(op(blocks.OrBlock, divides(num(3), var("i")), divides(num(5), var("i"))),
+                set_var("s", op(blocks.AddBlock, var("s"), var("i"))))),
+        set_var("n", num(27)), set_var("steps", num(0)),
+        while_block(op(blocks.NEqBlock, var("n"), num(1)),
+            set_var("e", divides(num(2), var("n"))),
+            if_block(var("e"), set_var("n", op(blocks.DivBlock, var("n"), num(2)))),
+            if_block(fill(blocks.NotBlock(), var("e")), set_var("n", op(blocks.AddBlock, op(blocks.MulBlock, var("n"), num(3)), num(1)))),
+            inc("steps"),
+            if_block(divides(num(20), var("steps")), show(var("n")))),
+    )]
+
+def functions():
+    fact = blocks.FuncBlock("fact", [
+        if_block(op(blocks.GrBlock, var("k"), num(1)),
+            set_var("r", op(blocks.MulBlock, var("r"), var("k"))),
+            fill(blocks.DecBlock(), var("k")),
+            blocks.CallBlock("fact")),
+        fill(blocks.RetBlock(), var("r")),
+    ])
+    return [fact, start(
+        set_var("k", num(10)), set_var("r", num(1)),
+        set_var("goal", blocks.CallBlock("fact")),
+        set_var("missing", blocks.CallBlock("nothing")),
+        show(var("goal")),
+    )]
+
+PROGRAMS = [operators, loops, functions]
+
+# runs a freshly built program, returns (global_vars, printed output)
+def run(builder, mode):
+    blocks.global_fns = {}
+    program = builder()
+    blocks.global_vars = {}
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        if mode == "step":
+            for _ in runner.program_steps(program):
+                pass
+        else:
+            for root in program:
+                if isinstance(root, blocks.StartBlock):
+                    root.execute() if mode == "interpret" else root.get_compiled()()
+    return blocks.global_vars, output.getvalue()
+
+class InterpretersAgree(unittest.TestCase):
+    def check(self, builder):
+        expected = run(builder, "interpret")
+        for mode in MODES[1:]:
+            with self.subTest(program = builder.__name__, mode = mode):
+                self.assertEqual(run(builder, mode), expected)
+        return expected
+
+    def test_programs(self):
+        for builder in PROGRAMS:
+            self.check(builder)
+
+    def test_results(self): # the reference interpreter itself gets them right
+        self.assertEqual(self.check(loops)[0]["s"], 2318.0)
+        self.assertEqual(self.check(functions)[0]["goal"], 3628800.0)
+        variables = self.check(operators)[0]
+        self.assertEqual((variables["a"], variables["d"], variables["f"]), (30.0, None, True))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+# Parallel blocks have to give the same result however many processes split the range, as if it ran in one
+
+# LIBRARY IMPORTS #
+import math
+import time
+import unittest
+
+# LOCAL MODULES #
+import blocks
+import console
+import runner
+from tests.test_interpreters import divides, fill, if_block, num, op, set_var, show, start, var
+
+def parallel(factory, name, lo, hi, target, *children):
+    return fill(factory(children = list(children)), var(name), lo, hi, var(target))
+
+LIMIT = blocks.PARALLEL_MIN * 5 # enough iterations to go to the pool
+
+# PROGRAMS #
+# 1e16, 0.5, -1e16, 0.5 over and over, adding them up one by one loses the 0.5s after each 1e16
+def absorbed():
+    return [start(parallel(blocks.ParallelSumBlock, "i", num(0), num(LIMIT), "t",
+        set_var("a", op(blocks.ModBlock, var("i"), num(2))),
+        set_var("b", op(blocks.ModBlock, var("i"), num(4))),
+        set_var("t", op(blocks.MulBlock, op(blocks.SubBlock, num(1), var("b")), op(blocks.SubBlock, num(1), var("a")))),
+        set_var("t", op(blocks.AddBlock, op(blocks.MulBlock, var("t"), num(1e16)), op(blocks.MulBlock, var("a"), num(0.5))))))]
+ABSORBED = LIMIT / 4 # all the 0.5s
+
+def thirds():
+    return [start(parallel(blocks.ParallelCountBlock, "i", num(0), num(LIMIT), "t",
+        set_var("t", divides(num(3), var("i")))))]
+
+# the largest i % 5, where every i % 7 == 0 leaves nan (infinity minus infinity)
+def nans():
+    inf = lambda: op(blocks.MulBlock, num(1e308), num(10))
+    return [start(parallel(blocks.ParallelMaxBlock, "i", num(0), num(LIMIT), "t",
+        set_var("t", op(blocks.ModBlock, var("i"), num(5))),
+        if_block(divides(num(7), var("i")), set_var("t", op(blocks.SubBlock, inf(), inf())))))]
+
+def squares():
+    return [start(parallel(blocks.ParallelSumBlock, "i", num(0), num(LIMIT), "t",
+        set_var("t", op(blocks.MulBlock, op(blocks.MulBlock, var("i"), var("i")), var("i")))))]
+
+def printing():
+    return [start(parallel(blocks.ParallelCountBlock, "i", num(0), num(LIMIT), "t", show(var("i"))))]
+
+class ProcessCounts(unittest.TestCase):
+    def setUp(self):
+        self.saved = blocks.parallel_processes, blocks.exact_ints
+
+    def tearDown(self):
+        blocks.parallel_processes, blocks.exact_ints = self.saved
+
+    def run_with(self, builder, processes):
+        blocks.parallel_processes = processes
+        blocks.global_fns = {}
+        return runner.execute_program(builder())["t"]
+
+    def check(self, builder, expected):
+        for processes in (1, 3):
+            with self.subTest(program = builder.__name__, processes = processes):
+                result = self.run_with(builder, processes)
+                self.assertEqual(result, expected)
+                self.assertIs(type(result), type(expected))
+
+    def test_float_mode(self):
+        self.check(absorbed, ABSORBED)
+        self.check(thirds, float(len(range(0, LIMIT, 3))))
+        self.check(nans, 4.0) # not 0, where the first nan is
+
+    def test_exact_mode(self):
+        blocks.exact_ints = True
+        self.check(squares, sum(i ** 3 for i in range(LIMIT)))
+        self.check(absorbed, ABSORBED)
+
+    def test_output(self): # what the chunks print reaches the game's console in order, from a worker like the game runs
+        blocks.parallel_processes = 3
+        lines = console.Console(size = LIMIT)
+        run = runner.WorkerRun(printing(), timeout = 60, output = lines)
+        while not run.poll():
+            time.sleep(0.01)
+        self.assertEqual(run.error, None)
+        self.assertEqual(lines.take(), ([str(float(i)) for i in range(LIMIT)], 0))
+
+if __name__ == "__main__":
+    unittest.main()
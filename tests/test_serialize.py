@@ -0,0 +1,112 @@
+# saving and loading programs in both of serialize.py's formats has to give back the same blocks
+
+# LIBRARY IMPORTS #
+import json
+import os
+import tempfile
+import unittest
+
+# LOCAL MODULES #
+import blocks
+import serialize
+from tests.test_interpreters import PROGRAMS, fill, num, run, set_var, start, var
+
+# everything about a block that gets saved, for comparing trees
+def describe(block):
+    slots = sorted((i, describe(item)) for i, item in block.slots.items()) if isinstance(block, blocks.SlotBlock) else []
+    field = block.field if isinstance(block, blocks.FieldBlock) else None
+    return (serialize.type_name(block), field, slots, [describe(child) for child in block.children])
+
+def describe_program(global_blocks):
+    return [(describe(root), tuple(root.pos)) for root in global_blocks]
+
+# a program with a bit of everything: fields, slot items, nested children, positions (negative too),
+# and a second function with the same name that isn't the registered one
+def mixed():
+    shadowed = blocks.FuncBlock("f", [set_var("x", num(1))])
+    func = blocks.FuncBlock("f", [fill(blocks.RetBlock(), fill(blocks.AddBlock(), var("x"), num(2)))])
+    main = start(set_var("x", num(5)), set_var("goal", blocks.CallBlock("f")), fill(blocks.PrintBlock(), blocks.TextBlock("héllo")))
+    empty = fill(blocks.IfBlock(children = [blocks.PrintBlock()]), blocks.TrueBlock()) # the print has an empty slot
+    for root, pos in zip((shadowed, func, main, empty), ((0, 0), (300, -40), (-25, 500), (70000, 3))):
+        root.pos = pos
+    return [shadowed, func, main, empty]
+
+# FuncBlocks register themselves while getting built
+def build(builder):
+    blocks.global_fns = {}
+    return builder()
+
+FORMATS = {
+    "json": (serialize.dumps_json, serialize.loads_json),
+    "binary": (serialize.dumps_binary, serialize.loads_binary),
+}
+
+class RoundTrip(unittest.TestCase):
+    def test_same_blocks(self):
+        for name, (dumps, loads) in FORMATS.items():
+            for builder in [mixed, *PROGRAMS]:
+                with self.subTest(format = name, program = builder.__name__):
+                    program = build(builder)
+                    data = dumps(program)
+                    loaded = loads(data)
+                    self.assertEqual(describe_program(loaded), describe_program(program))
+                    self.assertEqual(dumps(loaded), data)
+
+    def test_registered_function(self):
+        for name, (dumps, loads) in FORMATS.items():
+            with self.subTest(format = name):
+                loaded = loads(dumps(build(mixed)))
+                self.assertIs(blocks.global_fns["f"], loaded[1]) # not the shadowed one
+                blocks.global_vars = {}
+                loaded[2].execute()
+                self.assertEqual(blocks.global_vars["goal"], 7.0)
+
+    def test_runs_the_same(self):
+        for name, (dumps, loads) in FORMATS.items():
+            for builder in PROGRAMS:
+                with self.subTest(format = name, program = builder.__name__):
+                    data = dumps(build(builder))
+                    self.assertEqual(run(lambda: loads(data), "compiled"), run(builder, "compiled"))
+
+    def test_files(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for filename in ("program.pyblocks", "program.json"):
+                with self.subTest(file = filename):
+                    path = os.path.join(folder, filename)
+                    program = build(mixed)
+                    serialize.save_file(path, program)
+                    self.assertEqual(describe_program(serialize.load_file(path)), describe_program(program))
+            with open(os.path.join(folder, "program.json"), encoding = "utf-8") as f:
+                self.assertEqual(json.load(f)["format"], "pyblocks")
+
+class DamagedFiles(unittest.TestCase):
+    def check_fails(self, path):
+        build(mixed)
+        fns = dict(blocks.global_fns)
+        with self.assertRaises(ValueError):
+            serialize.load_file(path)
+        self.assertEqual(blocks.global_fns, fns) # still the functions of the program that was there
+
+    def test_truncated(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "program.pyblocks")
+            data = serialize.dumps_binary(mixed())
+            for end in (0, 3, 6, len(data) // 2, len(data) - 1):
+                with self.subTest(end = end):
+                    with open(path, "wb") as f:
+                        f.write(data[:end])
+                    self.check_fails(path)
+
+    def test_unknown_types(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "program.json")
+            for name in ("NoSuchBlock", "global_vars", "copy"):
+                with self.subTest(type = name):
+                    data = json.loads(serialize.dumps_json(mixed()))
+                    data["blocks"][2]["children"].append({"type": "FuncBlock", "field": "f", "registered": True, "children": [{"type": name}]})
+                    with open(path, "w", encoding = "utf-8") as f:
+                        json.dump(data, f)
+                    self.check_fails(path)
+
+if __name__ == "__main__":
+    unittest.main()